@@ -1,86 +1,332 @@
 import os
-import requests
-import feedparser
-import openai
+import re
+import atexit
+import hashlib
+import queue
+import threading
 import json
+from datetime import datetime, timedelta, timezone
+from xml.etree import ElementTree
 from dotenv import load_dotenv
-from pymongo import MongoClient, errors
+from pymongo import MongoClient, errors, UpdateOne, ASCENDING, TEXT
 from pymongo.server_api import ServerApi
-import textrazor
+from bson import ObjectId
+from concurrent.futures import ThreadPoolExecutor
+from backend.fanout import fan_out, iter_fan_out, bounded_map
+from backend.llm import ChatClient, FakeChatClient
+from backend.cache import LRUCache, MongoStore, EnrichmentCache, ResponseCache
+from backend.vectors import VectorIndex, IndexSaver, find_duplicates
+from backend.providers import ProviderClient, LATENCY_BUCKETS
+from backend.jobs import JobQueue
+from backend.keywords import KeywordExtractor, canonicalize
+from backend.atom import iter_arxiv_entries
+from backend.bodies import BODY_FIELDS, body_fields, pack_body, unpack_body
+from backend.services import services
+from backend.singleflight import SingleFlight, normalize_query
+from backend import metrics
 
 # Load environment variables from .env file
 load_dotenv()
 api_key = os.getenv('OPENAI_API_KEY')
-print(f"Loaded API Key: {api_key}")  # Debug print
 
-if not api_key:
-    raise ValueError("API key not found. Please set the OPENAI_API_KEY environment variable.")
+# Clients are created on first use through the service registry (see backend/services.py),
+# so importing this module opens no connections and each forked worker gets its own.
+# OFFLINE=1 swaps OpenAI for a canned local client, MongoDB for mongomock and skips
+# TextRazor, so the pipeline runs without credentials.
+OFFLINE = os.getenv('OFFLINE', '0') == '1'
 
-# Set the API key for the OpenAI client
-openai.api_key = api_key
+# Shared chat client: caps in-flight requests and keeps us inside the account's RPM/TPM quotas
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', 4))
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+
+
+def make_llm():
+    if OFFLINE:
+        return FakeChatClient(model=OPENAI_MODEL)
+    if not api_key:
+        raise ValueError("API key not found. Please set the OPENAI_API_KEY environment variable.")
+    return ChatClient(
+        api_key=api_key,
+        model=OPENAI_MODEL,
+        rpm=int(os.getenv('OPENAI_RPM', 500)),
+        tpm=int(os.getenv('OPENAI_TPM', 90000)),
+        concurrency=LLM_CONCURRENCY,
+        max_retries=int(os.getenv('OPENAI_MAX_RETRIES', 5))
+    )
+
+
+services.register("llm", make_llm)
+llm = services.proxy("llm")
+
+
+# Function to get the chat model name for cache and request keys. Falls back to the configured
+# model when the client can't be built, e.g. without an API key, so the call that follows
+# fails inside its own error handling instead of before it.
+def model_name():
+    try:
+        return llm.model
+    except ValueError:
+        return OPENAI_MODEL
 
 # Set up OpenAI API key from environment variable
 ieee_api_key = os.getenv('IEEE_API_KEY')
-textrazor.api_key = os.getenv('TEXTRAZOR_API_KEY')
+
+
+# Question-to-keywords step shared by the CLI and the web search; falls back to a
+# local extractor when TextRazor is slower than TEXTRAZOR_TIMEOUT seconds or unavailable
+def make_keyword_extractor():
+    return KeywordExtractor(
+        api_key=None if OFFLINE else os.getenv('TEXTRAZOR_API_KEY'),
+        timeout=float(os.getenv('TEXTRAZOR_TIMEOUT', 3)),
+        ttl=float(os.getenv('KEYWORD_CACHE_TTL', 86400))
+    )
+
+
+services.register("keywords", make_keyword_extractor)
+keyword_extractor = services.proxy("keywords")
 
 # Set up MongoDB connection
 mongodb_uri = os.getenv('MONGODB_URI')
-client = MongoClient(mongodb_uri, server_api=ServerApi('1'))
-db = client["research_database"]
-collection = db["articles"]
+
+
+def make_mongo_client():
+    if OFFLINE:
+        # Only needed for offline runs and tests
+        import mongomock
+        return mongomock.MongoClient()
+    return MongoClient(mongodb_uri, server_api=ServerApi('1'))
+
+
+# mongomock can't run the bulk operations current PyMongo releases build, so offline
+# collections apply them one at a time
+class OfflineCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    # mongomock adds to the projection it is given; keep shared ones such as LARGE_FIELDS intact
+    def find(self, filter=None, projection=None, *args, **kwargs):
+        return self.collection.find(filter, dict(projection) if projection else projection, *args, **kwargs)
+
+    def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            self.collection.update_one(operation._filter, operation._doc, upsert=operation._upsert)
+
+
+def get_mongo_collection(name):
+    mongo_collection = services.get("db")[name]
+    return OfflineCollection(mongo_collection) if OFFLINE else mongo_collection
+
+
+services.register("mongo", make_mongo_client)
+services.register("db", lambda: services.get("mongo")["research_database"])
+services.register("articles", lambda: get_mongo_collection("articles"))
+services.register("enrichment_store", lambda: get_mongo_collection("enrichment_cache"))
+services.register("response_store", lambda: get_mongo_collection("response_cache"))
+services.register("bodies", lambda: get_mongo_collection("article_bodies"))
+client = services.proxy("mongo")
+db = services.proxy("db")
+collection = services.proxy("articles")
+
+# Articles are stored in two parts: slim, indexed metadata in `articles` (title, source,
+# url/doi, summary, topics, keywords, timestamps) and the bulky content and embedding in
+# `article_bodies`, keyed by article key, with the content zlib-compressed at this level.
+# Run `python -m backend.migrate` once to move an existing collection to this layout.
+bodies = services.proxy("bodies")
+BODY_COMPRESSION_LEVEL = int(os.getenv('BODY_COMPRESSION_LEVEL', 6))
+
+# Summaries and topics keyed by a hash of (content, model, prompt version).
+# Bump a prompt version whenever its prompt text changes so stale entries are ignored.
+SUMMARY_PROMPT_VERSION = 1
+TOPICS_PROMPT_VERSION = 1
+COMBINED_PROMPT_VERSION = 1
+
+enrichment_cache = EnrichmentCache(
+    LRUCache(maxsize=int(os.getenv('ENRICHMENT_CACHE_SIZE', 4096))),
+    MongoStore(services.proxy("enrichment_store"))
+)
+
+# "separate" makes two calls per article (summary, then topics from the summary);
+# "combined" asks for both in a single JSON reply and falls back to "separate" if it can't be parsed
+# "batch" packs several abstracts into one prompt sized by BATCH_TOKEN_BUDGET input tokens and
+# retries any item missing from the reply on its own
+ENRICHMENT_MODE = os.getenv('ENRICHMENT_MODE', 'separate')
+BATCH_TOKEN_BUDGET = int(os.getenv('BATCH_TOKEN_BUDGET', 3000))
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 8))
+
+# Embeddings of each article's title and content, kept in a local nearest-neighbour index
+# used for "similar papers" and to skip enriching near-duplicates of papers we already have
+EMBEDDINGS_ENABLED = os.getenv('EMBEDDINGS_ENABLED', '0') == '1'
+EMBEDDING_MODEL = os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-ada-002')
+DUPLICATE_THRESHOLD = float(os.getenv('DUPLICATE_THRESHOLD', 0.95))
+# The embeddings themselves live in the body store; the file at VECTOR_INDEX_PATH is a snapshot
+# to start from. Each process pulls in the embeddings other processes stored and writes its
+# snapshot from a background thread every VECTOR_INDEX_SAVE_INTERVAL seconds, never on a request.
+VECTOR_INDEX_PATH = os.getenv('VECTOR_INDEX_PATH', os.path.join(os.path.dirname(__file__), 'vector_index.npz'))
+VECTOR_INDEX_SAVE_INTERVAL = float(os.getenv('VECTOR_INDEX_SAVE_INTERVAL', 60))
+
+
+def make_vector_index():
+    index = VectorIndex.load(VECTOR_INDEX_PATH) if os.path.exists(VECTOR_INDEX_PATH) else VectorIndex()
+    if EMBEDDINGS_ENABLED:
+        saver = IndexSaver(index, VECTOR_INDEX_PATH, VECTOR_INDEX_SAVE_INTERVAL, before_save=EmbeddingSync())
+        saver.start()
+        atexit.register(saver.stop)
+    return index
+
+
+services.register("vector_index", make_vector_index)
+vector_index = services.proxy("vector_index")
+
+# Ground chat answers in the stored articles: the RAG_TOP_K best matches for the question are
+# packed into the prompt within RAG_TOKEN_BUDGET tokens, and both the assembled context and
+# the answer are cached for RAG_CACHE_TTL seconds so repeated questions cost nothing
+CHAT_RAG = os.getenv('CHAT_RAG', '0') == '1'
+RAG_TOP_K = int(os.getenv('RAG_TOP_K', 5))
+RAG_TOKEN_BUDGET = int(os.getenv('RAG_TOKEN_BUDGET', 1200))
+RAG_CACHE_TTL = float(os.getenv('RAG_CACHE_TTL', 3600))
+rag_context_cache = LRUCache(maxsize=int(os.getenv('RAG_CACHE_SIZE', 1024)), ttl=RAG_CACHE_TTL)
+rag_answer_cache = LRUCache(maxsize=int(os.getenv('RAG_CACHE_SIZE', 1024)), ttl=RAG_CACHE_TTL)
+
+# Searches and chat questions being worked on right now. Identical ones that arrive meanwhile,
+# e.g. a burst of users searching a trending topic, wait for that result instead of repeating
+# the provider, OpenAI and MongoDB work.
+search_flights = SingleFlight("search")
+chat_flights = SingleFlight("chat")
+
+# Background searches are queued in a local SQLite file shared with any worker processes.
+# A worker that dies leaves its job to be requeued JOB_LEASE seconds later; finished jobs are
+# kept JOB_RETENTION seconds for clients to read their results.
+JOB_DB_PATH = os.getenv('JOB_DB_PATH', os.path.join(os.path.dirname(__file__), 'jobs.db'))
+JOB_LEASE = float(os.getenv('JOB_LEASE', 300))
+JOB_RETENTION = float(os.getenv('JOB_RETENTION', 7 * 86400))
+services.register("jobs", lambda: JobQueue(JOB_DB_PATH, lease=JOB_LEASE, retention=JOB_RETENTION))
+job_queue = services.proxy("jobs")
+
+# Number of articles requested from each provider per search
+RESULTS_PER_PROVIDER = int(os.getenv('RESULTS_PER_PROVIDER', 2))
+
+# Answer searches from the stored articles first and only go upstream when fewer than
+# a full search's worth of them (one page from every provider) match the query. A stored
+# article only counts when it contains every keyword and its text score averages at least
+# LOCAL_MIN_SCORE per keyword, so loosely related papers don't hide fresh results.
+LOCAL_FIRST = os.getenv('LOCAL_FIRST', '1') == '1'
+LOCAL_TARGET = 3 * RESULTS_PER_PROVIDER
+LOCAL_MIN_SCORE = float(os.getenv('LOCAL_MIN_SCORE', 2.0))
+
+# Time budget in seconds for each provider; slower providers are dropped from the results
+PROVIDER_TIMEOUT = float(os.getenv('PROVIDER_TIMEOUT', 10))
+PROVIDER_BUDGETS = {
+    "Cornell Arxiv": float(os.getenv('ARXIV_TIMEOUT', PROVIDER_TIMEOUT)),
+    "Europe PMC": float(os.getenv('EUROPEPMC_TIMEOUT', PROVIDER_TIMEOUT)),
+    "IEEE Xplore": float(os.getenv('IEEE_TIMEOUT', PROVIDER_TIMEOUT)),
+}
+
+# Parsed provider responses, keyed on (provider, query, page size). "memory" keeps them in
+# this process; "mongo" shares them between workers; "off" always goes to the network.
+# Stale entries are kept to revalidate with the provider, and MongoDB deletes them once
+# RESPONSE_CACHE_RETENTION seconds have passed since they were last refreshed.
+RESPONSE_CACHE = os.getenv('RESPONSE_CACHE', 'memory')
+RESPONSE_CACHE_RETENTION = float(os.getenv('RESPONSE_CACHE_RETENTION', 7 * 86400))
+if RESPONSE_CACHE == 'mongo':
+    response_cache = ResponseCache(MongoStore(services.proxy("response_store"), ttl=RESPONSE_CACHE_RETENTION))
+elif RESPONSE_CACHE == 'memory':
+    response_cache = ResponseCache(LRUCache(maxsize=int(os.getenv('RESPONSE_CACHE_SIZE', 1024))))
+else:
+    response_cache = None
+
+# One pooled, keep-alive HTTP client per provider, shared by every request in the process.
+# Cached responses stay fresh for the provider's TTL in seconds and are then revalidated.
+def make_provider_client(name, url, cache_ttl):
+    return ProviderClient(
+        name,
+        url,
+        connect_timeout=float(os.getenv('PROVIDER_CONNECT_TIMEOUT', 3.05)),
+        read_timeout=PROVIDER_BUDGETS[name],
+        budget=PROVIDER_BUDGETS[name],
+        retries=int(os.getenv('PROVIDER_RETRIES', 2)),
+        cache=response_cache,
+        cache_ttl=cache_ttl
+    )
+
+
+services.register("arxiv", lambda: make_provider_client(
+    "Cornell Arxiv",
+    os.getenv('ARXIV_URL', "http://export.arxiv.org/api/query"),
+    float(os.getenv('ARXIV_CACHE_TTL', 3600))
+))
+services.register("europepmc", lambda: make_provider_client(
+    "Europe PMC",
+    os.getenv('EUROPEPMC_URL', "https://www.ebi.ac.uk/europepmc/webservices/rest/search"),
+    float(os.getenv('EUROPEPMC_CACHE_TTL', 3600))
+))
+services.register("ieee", lambda: make_provider_client(
+    "IEEE Xplore",
+    os.getenv('IEEE_URL', "http://ieeexploreapi.ieee.org/api/v1/search/articles"),
+    float(os.getenv('IEEE_CACHE_TTL', 3600))
+))
+arxiv_client = services.proxy("arxiv")
+euro_client = services.proxy("europepmc")
+ieee_client = services.proxy("ieee")
+PROVIDER_CLIENTS = [arxiv_client, euro_client, ieee_client]
 
 def user_input():
     user_inp = input("Enter your research question")
-    keywords = ""
-    client = textrazor.TextRazor(extractors=["entities"])
-    response = client.analyze(user_inp)
+    # Space separated; the provider clients URL-encode their parameters
+    return keyword_extractor.query(user_inp)
 
-    for entity in response.entities():
-        keywords+=f"{(entity.english_id)} "
+# Query parameters for each provider's search
+def cornell_params(max_results, keywords):
+    return {
+        "search_query": f"all:{keywords}",
+        "max_results": max_results
+    }
 
-    words = keywords.split()
-    seen = set()
-    for word in words:
-        word_l = word.lower()
-        seen.add(word_l)
 
-    # Join the unique words with commas
-    result = '%20'.join(seen)
-    return result
+def euro_params(page_size, keywords):
+    return {
+        "query": keywords,
+        "format": "json",
+        "pageSize": page_size
+    }
 
-def retrieve_cornell(max_results, keywords):
-    url_cornell = f"http://export.arxiv.org/api/query?search_query=all:{keywords}&max_results={max_results}"
-    response_cornell = requests.get(url_cornell)
 
-    if response_cornell.status_code == 200:
-        feed = feedparser.parse(response_cornell.content)
+def ieee_params(max_records, keywords):
+    return {
+        "apikey": ieee_api_key,
+        "format": "json",
+        "max_records": max_records,
+        "start_record": 1,
+        "sort_order": "asc",
+        "sort_field": "article_number",
+        "querytext": keywords
+    }
 
-        if not feed.entries:
-            return []
 
-        articles = []
-        for entry in feed.entries:
-            article_data = {
-                "source": "Cornell Arxiv",
-                "url": entry.get('id', ''),
-                "title": entry.get('title', 'No title available'),
-                "content": entry.get('summary', 'No summary available')
-            }
-            articles.append(article_data)
+def retrieve_cornell(max_results, keywords):
+    return arxiv_client.fetch(cornell_params(max_results, keywords), parse_cornell, keywords, max_results)
+
 
+# Function to turn an arXiv Atom response into article dicts
+def parse_cornell(response_cornell):
+    if response_cornell.status_code == 200:
+        articles = []
+        try:
+            articles.extend(iter_arxiv_entries([response_cornell.content]))
+        except ElementTree.ParseError as e:
+            print(f"Malformed arXiv feed, keeping the {len(articles)} articles before the error: {e}")
         return articles
     return []
 
 
 def retrieve_euro(page_size, keywords):
-    url_euro = "https://www.ebi.ac.uk/europepmc/webservices/rest/search"
-    params = {
-        "query": keywords,
-        "format": "json",
-        "pageSize": page_size
-    }
-    response_euro = requests.get(url_euro, params=params)
+    return euro_client.fetch(euro_params(page_size, keywords), parse_euro, keywords, page_size)
 
+
+# Function to turn a Europe PMC JSON response into article dicts
+def parse_euro(response_euro):
     if response_euro.status_code == 200:
         data = response_euro.json()
         articles = data.get('resultList', {}).get('result', [])
@@ -111,18 +357,11 @@ def retrieve_euro(page_size, keywords):
 
 
 def retrieve_ieee(max_records, keywords):
-    url = "http://ieeexploreapi.ieee.org/api/v1/search/articles"
-    params = {
-        "apikey": ieee_api_key,
-        "format": "json",
-        "max_records": max_records,
-        "start_record": 1,
-        "sort_order": "asc",
-        "sort_field": "article_number",
-        "querytext": keywords
-    }
+    return ieee_client.fetch(ieee_params(max_records, keywords), parse_ieee, keywords, max_records)
 
-    response = requests.get(url, params=params)
+
+# Function to turn an IEEE Xplore JSON response into article dicts
+def parse_ieee(response):
     if response.status_code == 200:
         articles = response.json().get('articles', [])
 
@@ -142,100 +381,775 @@ def retrieve_ieee(max_records, keywords):
     return []
 
 
-def process_article(article_data):
+# Placeholder contents the providers use when an article has no abstract
+NO_CONTENT = ('No summary available', 'No abstract available')
+NO_CONTENT_SUMMARY = "As there's no available content provided, a summary cannot be created."
+NO_CONTENT_TOPICS = ["Lack of available content", "Inability to create a summary"]
+
+
+# Function to add a summary and topics to an article without saving it
+def enrich_article(article_data):
     content = article_data.get('content', '')
-    if content == 'No summary available' or content == 'No abstract available':
-        summary = "As there's no available content provided, a summary cannot be created."
-        topics = ["Lack of available content", "Inability to create a summary"]
+    if content in NO_CONTENT:
+        summary, topics = NO_CONTENT_SUMMARY, list(NO_CONTENT_TOPICS)
     else:
-        summary = summarize_with_openai(content)
-        topics = extract_topics_with_openai(summary).get("topics", [])
+        result = summarize_and_extract_with_openai(content) if ENRICHMENT_MODE in ("combined", "batch") else None
+        if result:
+            summary, topics = result["summary"], result["topics"]
+        else:
+            summary = summarize_with_openai(content)
+            topics = extract_topics_with_openai(summary).get("topics", [])
 
     article_data.update({"summary": summary, "topics": topics})
-    insert_to_mongodb(article_data)
     return article_data
 
 
+# Function to add an embedding of each article's title and content; returns False if it failed
+def embed_articles(articles):
+    if not articles:
+        return True
+    # Trim very long abstracts to stay inside the embedding model's input limit
+    texts = [f"{article.get('title', '')}\n{article.get('content', '')}"[:8000] for article in articles]
+    try:
+        vectors = llm.embed(texts, model=EMBEDDING_MODEL)
+    except Exception as e:
+        print(f"Error embedding articles: {e}")
+        return False
+    for article, vector in zip(articles, vectors):
+        article["embedding"] = vector
+    return True
+
+
+# Function to add embedded articles to the vector index; the saver thread persists them
+def index_articles(articles):
+    embedded = [article for article in articles if "embedding" in article]
+    vector_index.add([article_key(article) for article in embedded], [article["embedding"] for article in embedded])
+
+
+# Loads the stored embeddings a process's vector index is missing, e.g. ones saved by other
+# workers, `batch_size` bodies per round-trip. The first run checks every stored embedding;
+# later runs only read the ones saved since the previous run, less `margin` seconds for
+# clocks that differ between workers and writes that finished late.
+class EmbeddingSync:
+    def __init__(self, batch_size=500, margin=60.0):
+        self.batch_size = batch_size
+        self.margin = timedelta(seconds=margin)
+        self.watermark = None
+
+    def __call__(self, index):
+        previous = self.watermark
+        # Taken before reading, so an embedding saved while this runs is read next time
+        self.watermark = datetime.now(timezone.utc)
+        try:
+            if previous is None:
+                stored = [document["_id"] for document in bodies.find({"embedding": {"$exists": True}}, {"_id": 1})]
+                missing = [key for key in stored if key not in index]
+                for start in range(0, len(missing), self.batch_size):
+                    loaded = load_bodies(missing[start:start + self.batch_size], ("embedding",))
+                    index.add(list(loaded), [fields["embedding"] for fields in loaded.values()])
+            else:
+                cursor = bodies.find({"embedded_at": {"$gt": previous - self.margin}}, {"embedding": 1})
+                batch = []
+                for document in cursor:
+                    batch.append(document)
+                    if len(batch) >= self.batch_size:
+                        index.add([d["_id"] for d in batch], [d["embedding"] for d in batch])
+                        batch = []
+                index.add([d["_id"] for d in batch], [d["embedding"] for d in batch])
+        except errors.PyMongoError as e:
+            self.watermark = previous
+            metrics.error("mongo", op="sync_vector_index")
+            print(f"Error loading embeddings from MongoDB: {e}")
+
+
+# Function to find a stored article that is a near-duplicate of an embedded article
+def find_stored_duplicate(article):
+    matches = vector_index.query(article["embedding"], k=1)
+    if not matches or matches[0][1] < DUPLICATE_THRESHOLD:
+        return None
+    try:
+        return collection.find_one({"key": matches[0][0], "summary": {"$exists": True}}, {"summary": 1, "topics": 1})
+    except errors.PyMongoError as e:
+        metrics.error("mongo", op="find_stored_duplicate")
+        print(f"Error retrieving article from MongoDB: {e}")
+        return None
+
+
+# Function to collapse near-duplicate articles before they are enriched. Articles matching a
+# stored article reuse its summary and topics; articles matching an earlier article in the same
+# list come back as (duplicate, original) pairs to copy from once the original is enriched.
+# Returns the articles that still need enriching and those pairs.
+def collapse_duplicates(articles):
+    if not articles or not embed_articles(articles):
+        return articles, []
+
+    unique = []
+    pairs = []
+    canonical = find_duplicates([article["embedding"] for article in articles], DUPLICATE_THRESHOLD)
+    for article, original in zip(articles, canonical):
+        if original is not None:
+            pairs.append((article, articles[original]))
+            continue
+        stored = find_stored_duplicate(article)
+        if stored:
+            article.update({"summary": stored["summary"], "topics": stored.get("topics", [])})
+        else:
+            unique.append(article)
+    return unique, pairs
+
+
+# Function to split contents into batches of positions that fit a prompt token budget
+def plan_batches(contents, token_budget, max_items):
+    batches, current, used = [], [], 0
+    for position, content in enumerate(contents):
+        cost = len(content) // 4 + 1
+        if current and (used + cost > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(position)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Function to enrich a list of articles in place using the configured ENRICHMENT_MODE
+@metrics.traced("enrich_articles")
+def enrich_articles(articles):
+    if ENRICHMENT_MODE != "batch":
+        return bounded_map(enrich_article, articles, LLM_CONCURRENCY)
+
+    pending = []
+    for article in articles:
+        content = article.get('content', '')
+        if content in NO_CONTENT:
+            enrich_article(article)
+            continue
+        cached = enrichment_cache.get(enrichment_cache.key("combined", content, model_name(), COMBINED_PROMPT_VERSION))
+        if cached:
+            article.update({"summary": cached["summary"], "topics": cached["topics"]})
+        else:
+            pending.append(article)
+
+    def run_batch(batch):
+        if len(batch) == 1:
+            enrich_article(batch[0])
+            return
+        results = summarize_batch_with_openai([article['content'] for article in batch])
+        for position, article in enumerate(batch):
+            result = results.get(position)
+            if result:
+                cache_key = enrichment_cache.key("combined", article['content'], model_name(), COMBINED_PROMPT_VERSION)
+                enrichment_cache.set(cache_key, result)
+                article.update({"summary": result["summary"], "topics": result["topics"]})
+            else:
+                # The batch reply left this item out or mangled it, so retry it on its own
+                enrich_article(article)
+
+    batches = plan_batches([article['content'] for article in pending], BATCH_TOKEN_BUDGET, BATCH_MAX_ITEMS)
+    bounded_map(run_batch, [[pending[position] for position in batch] for batch in batches], LLM_CONCURRENCY)
+    return articles
+
+
+# Prompts for the enrichment calls
+def summary_messages(content):
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": f"Please summarize the following content: {content}"}
+    ]
+
+
+def topics_messages(text):
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": f"List the main topics of the story, each on its own line without any other text, and no bullet points. Be brief and to the point': {text}"}
+    ]
+
+
+def combined_messages(content):
+    return [
+        {"role": "system", "content": "You are a helpful assistant that only replies with JSON."},
+        {"role": "user", "content": (
+            "Summarize the following content and list its main topics. Reply with a JSON object "
+            'of the form {"summary": "<summary>", "topics": ["<topic>", ...]} and nothing else. '
+            f"Keep each topic brief and to the point: {content}"
+        )}
+    ]
+
+
+# Function to turn a one-topic-per-line reply into a list of topics
+def parse_topics(topics_text):
+    # Split by commas or newlines and strip whitespace
+    topics = [topic.strip() for topic in topics_text.split('\n') if topic.strip()]
+    return [topic for topic in topics if not topic.startswith("The main topics of the text are:")]
+
+
 # Function to generate summary using OpenAI's GPT-4
+@metrics.traced("summary")
 def summarize_with_openai(content):
+    cache_key = enrichment_cache.key("summary", content, model_name(), SUMMARY_PROMPT_VERSION)
+    cached = enrichment_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     try:
-        response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": f"Please summarize the following content: {content}"}
-        ],
-        max_tokens=150)
+        response = llm.create(messages=summary_messages(content), max_tokens=150)
         summary = response.choices[0].message.content.strip()
+        enrichment_cache.set(cache_key, summary)
         return summary
     except Exception as e:
+        metrics.error("summary")
         print(e)
         return "Summarization failed"
 
 
 # Function to extract topics using OpenAI's GPT-4
+@metrics.traced("topics")
 def extract_topics_with_openai(text):
+    cache_key = enrichment_cache.key("topics", text, model_name(), TOPICS_PROMPT_VERSION)
+    cached = enrichment_cache.get(cache_key)
+    if cached is not None:
+        return {"topics": cached}
+
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": f"List the main topics of the story, each on its own line without any other text, and no bullet points. Be brief and to the point': {text}"}
-            ],
-            max_tokens=100
-        )
-        topics_text = response.choices[0].message.content.strip()
-        # Split by commas or newlines and strip whitespace
-        topics = [topic.strip() for topic in topics_text.split('\n') if topic.strip()]
-        topics = [topic for topic in topics if not topic.startswith("The main topics of the text are:")]
+        response = llm.create(messages=topics_messages(text), max_tokens=100)
+        topics = parse_topics(response.choices[0].message.content.strip())
+        enrichment_cache.set(cache_key, topics)
         return {"topics": topics}
     except Exception as e:
+        metrics.error("topics")
         return {"topics": ["Topic extraction failed"]}
 
-# Function to insert article data into MongoDB
-def insert_to_mongodb(article_data):
-    article_data["keywords"] = KEYWORDS
+# Function to decode a JSON reply, returning None if it is not valid JSON
+def load_json_reply(text):
+    text = text.strip()
+    # Models sometimes wrap JSON in a markdown code fence
+    if text.startswith("```"):
+        text = text.strip("`").strip()
+        if text.startswith("json"):
+            text = text[len("json"):]
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+# Function to check a {"summary": ..., "topics": [...]} object, returning a cleaned copy or None
+def validate_enrichment(data):
+    if not isinstance(data, dict):
+        return None
+    summary = data.get("summary")
+    topics = data.get("topics")
+    if not isinstance(summary, str) or not summary.strip():
+        return None
+    if not isinstance(topics, list) or not all(isinstance(topic, str) for topic in topics):
+        return None
+    return {"summary": summary.strip(), "topics": [topic.strip() for topic in topics if topic.strip()]}
+
+
+# Function to parse a {"summary": ..., "topics": [...]} reply, returning None if it is malformed
+def parse_enrichment_json(text):
+    return validate_enrichment(load_json_reply(text))
+
+
+# Function to generate the summary and topics in one OpenAI call; returns None when the reply can't be used
+@metrics.traced("enrichment")
+def summarize_and_extract_with_openai(content):
+    cache_key = enrichment_cache.key("combined", content, model_name(), COMBINED_PROMPT_VERSION)
+    cached = enrichment_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     try:
-        collection.insert_one(article_data)
-        # print(f"Article '{article_data['title']}' inserted successfully!")
+        response = llm.create(messages=combined_messages(content), max_tokens=250, temperature=0)
+        result = parse_enrichment_json(response.choices[0].message.content)
     except Exception as e:
-        print(f"Error inserting article to MongoDB: {e}")
+        metrics.error("enrichment")
+        print(e)
+        return None
+
+    if result is None:
+        metrics.error("enrichment", reason="invalid_json")
+        print("Combined enrichment reply was not valid JSON, falling back to separate calls")
+        return None
+    enrichment_cache.set(cache_key, result)
+    return result
 
 
-# Function to get articles from inside MongoDB
-def get_articles():
-    try: 
-        articles = list(collection.find())
-        return articles
+# Function to summarize several contents in one OpenAI call. Returns {position: {"summary", "topics"}}
+# for the items whose part of the reply could be parsed; missing positions should be retried on their own.
+@metrics.traced("batch_enrichment")
+def summarize_batch_with_openai(contents):
+    numbered = "\n\n".join(f"[{position}] {content}" for position, content in enumerate(contents))
+    try:
+        response = llm.create(
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that only replies with JSON."},
+                {"role": "user", "content": (
+                    "Summarize each of the numbered items below and list its main topics. Reply with a JSON object "
+                    'of the form {"items": [{"index": <number>, "summary": "<summary>", "topics": ["<topic>", ...]}]} '
+                    "with one entry per item and nothing else. Keep each topic brief and to the point.\n\n"
+                    f"{numbered}"
+                )}
+            ],
+            max_tokens=250 * len(contents),
+            temperature=0
+        )
+        data = load_json_reply(response.choices[0].message.content)
+    except Exception as e:
+        metrics.error("batch_enrichment")
+        print(e)
+        return {}
+
+    items = data.get("items") if isinstance(data, dict) else None
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        position = item.get("index") if isinstance(item, dict) else None
+        result = validate_enrichment(item)
+        if isinstance(position, int) and 0 <= position < len(contents) and result and position not in results:
+            results[position] = result
+    return results
+
+
+# Function to build a stable identifier for an article: the arXiv id (without version),
+# the DOI, or a hash of the normalized title. Saving by this key keeps repeated searches
+# from piling up duplicate documents.
+def article_key(article_data):
+    match = re.search(r'arxiv\.org/abs/(.+?)(v\d+)?$', article_data.get('url', ''))
+    if match:
+        return f"arxiv:{match.group(1).lower()}"
+
+    doi = (article_data.get('doi') or '').strip().lower()
+    doi = re.sub(r'^(https?://(dx\.)?doi\.org/|doi:)', '', doi)
+    if doi and doi != 'nan':
+        return f"doi:{doi}"
+
+    title = re.sub(r'\W+', ' ', article_data.get('title', '')).strip().lower()
+    return "title:" + hashlib.sha1(title.encode('utf-8')).hexdigest()
+
+
+# Function to create the indexes the article queries rely on; safe to run on every startup
+@metrics.traced("mongo", op="ensure_indexes")
+def ensure_indexes():
+    try:
+        # Partial so documents saved before keys existed don't collide on a missing key
+        collection.create_index(
+            [("key", ASCENDING)],
+            name="key_unique",
+            unique=True,
+            partialFilterExpression={"key": {"$exists": True}}
+        )
+        # History page filters, each paired with _id for the newest-first range scan
+        collection.create_index([("source", ASCENDING), ("_id", -1)], name="source_id")
+        collection.create_index([("keywords", ASCENDING), ("_id", -1)], name="keywords_id")  # multikey: one entry per keyword
+        # Full-text search over stored articles, ranked with titles and topics counting most.
+        # The content lives in the body store, so the summary stands in for it.
+        collection.create_index(
+            [("title", TEXT), ("topics", TEXT), ("summary", TEXT)],
+            name="article_text",
+            weights={"title": 10, "topics": 5, "summary": 3}
+        )
+        # Embeddings saved since a given time, for the vector index sync
+        bodies.create_index([("embedded_at", ASCENDING)], name="embedded_at", sparse=True)
+        if RESPONSE_CACHE == 'mongo':
+            # Let MongoDB delete provider responses once they pass their expires_at date
+            services.get("response_store").create_index([("expires_at", ASCENDING)], name="expires_at", expireAfterSeconds=0)
     except errors.PyMongoError as e:
+        metrics.error("mongo", op="ensure_indexes")
+        print(f"Error creating MongoDB indexes: {e}")
+
+
+# Function to build one metadata upsert per distinct article, keyed on article_key. Body
+# fields the article carries are saved by body_upserts and dropped from the metadata. The
+# search's canonical keywords are added to the article's `keywords` array, so an article
+# found by several searches keeps all of them.
+def article_upserts(articles, keywords):
+    now = datetime.now(timezone.utc)
+    terms = canonicalize([keywords]) if keywords else []
+    documents = {}
+    for article in articles:
+        document = {field: value for field, value in article.items() if field not in ("_id", "keywords") and field not in BODY_FIELDS}
+        document.update({"key": article_key(article), "updated_at": now})
+        documents[document["key"]] = (document, list(body_fields(article)))
+    operations = []
+    for key, (document, moved) in documents.items():
+        update = {"$set": document, "$setOnInsert": {"created_at": now}}
+        if terms:
+            update["$addToSet"] = {"keywords": {"$each": terms}}
+        if moved:
+            update["$unset"] = {field: "" for field in moved}
+        operations.append(UpdateOne({"key": key}, update, upsert=True))
+    return operations
+
+
+# Function to build one body store upsert per distinct article that has a body
+def body_upserts(articles):
+    now = datetime.now(timezone.utc)
+    documents = {}
+    for article in articles:
+        fields = body_fields(article)
+        if fields:
+            document = pack_body(fields, BODY_COMPRESSION_LEVEL)
+            if "embedding" in document:
+                # Lets each worker's vector index pick up only the embeddings saved since it last looked
+                document["embedded_at"] = now
+            documents[article_key(article)] = document
+    return [UpdateOne({"_id": key}, {"$set": document}, upsert=True) for key, document in documents.items()]
+
+
+# Function to save a search's processed articles with one unordered bulk upsert per store.
+# Bodies go first so a listed article always has its content to load.
+@metrics.traced("mongo", op="save_articles")
+def save_articles(articles, keywords):
+    operations = article_upserts(articles, keywords)
+    if not operations:
+        return
+    body_operations = body_upserts(articles)
+    try:
+        if body_operations:
+            bodies.bulk_write(body_operations, ordered=False)
+        collection.bulk_write(operations, ordered=False)
+    except errors.BulkWriteError as e:
+        metrics.error("mongo", op="save_articles")
+        print(f"Error saving some articles to MongoDB: {e.details.get('writeErrors')}")
+    except errors.PyMongoError as e:
+        metrics.error("mongo", op="save_articles")
+        print(f"Error saving articles to MongoDB: {e}")
+
+
+# Function to insert article data into MongoDB, tagged with the keywords of the search that found it
+def insert_to_mongodb(article_data, keywords=None):
+    save_articles([article_data], keywords)
+
+
+# Fields left out of history listings; they are loaded on demand. Only articles saved
+# before the body store was split out still carry them.
+LARGE_FIELDS = {"content": 0, "embedding": 0}
+
+
+# Function to load body fields from the body store for the given article keys: {key: fields}
+def load_bodies(keys, fields=("content",)):
+    projection = {field: 1 for field in fields}
+    if "content" in fields:
+        projection["codec"] = 1
+    return {document["_id"]: unpack_body(document) for document in bodies.find({"_id": {"$in": list(keys)}}, projection)}
+
+
+# Function to fill in the content of stored articles that were read without it
+def attach_content(articles):
+    missing = [article for article in articles if "content" not in article and article.get("key")]
+    if missing:
+        stored = load_bodies({article["key"] for article in missing})
+        for article in missing:
+            if "content" in stored.get(article["key"], {}):
+                article["content"] = stored[article["key"]]["content"]
+    return articles
+
+
+# Function to get one page of articles from inside MongoDB, newest first. `before` is the
+# id of the last article on the previous page. Returns the articles and the cursor for
+# the next page (None on the last page).
+@metrics.traced("mongo", op="get_articles")
+def get_articles(limit=20, before=None, source=None, keyword=None):
+    query = articles_query(before, source, keyword)
+    if query is None:
+        return [], None
+
+    try:
+        # Fetch one extra document to learn whether there is a next page
+        articles = list(collection.find(query, LARGE_FIELDS).sort("_id", -1).limit(limit + 1))
+    except errors.PyMongoError as e:
+        metrics.error("mongo", op="get_articles")
         print(f"Error retrieving articles from MongoDB: {e}")
+        return [], None
+    return split_page(articles, limit)
+
+
+# Function to build the history page filter; returns None when the cursor is invalid
+def articles_query(before=None, source=None, keyword=None):
+    query = {}
+    if source:
+        query["source"] = source
+    if keyword:
+        # Articles keep the canonical keywords of every search that found them; a single
+        # word matches by membership and several must all be present
+        terms = canonicalize([keyword])
+        if len(terms) == 1:
+            query["keywords"] = terms[0]
+        elif terms:
+            query["keywords"] = {"$all": terms}
+    if before:
+        if not ObjectId.is_valid(before):
+            return None
+        query["_id"] = {"$lt": ObjectId(before)}
+    return query
+
+
+# Function to cut the extra look-ahead document off a page and work out the next cursor
+def split_page(articles, limit):
+    if len(articles) > limit:
+        articles = articles[:limit]
+        return articles, str(articles[-1]["_id"])
+    return articles, None
+
+
+# Function to find the stored articles most similar to a given one, by embedding
+@metrics.traced("mongo", op="similar_articles")
+def similar_articles(article_id, k=5):
+    if not ObjectId.is_valid(article_id):
         return []
+    try:
+        article = collection.find_one({"_id": ObjectId(article_id)}, {"key": 1, "embedding": 1})
+        if article and "embedding" not in article and article.get("key"):
+            article.update(load_bodies([article["key"]], ("embedding",)).get(article["key"], {}))
+        if not article or "embedding" not in article:
+            return []
+        matches = [
+            (key, score) for key, score in vector_index.query(article["embedding"], k + 1)
+            if key != article.get("key")
+        ][:k]
+        stored = {
+            doc["key"]: doc
+            for doc in collection.find({"key": {"$in": [key for key, score in matches]}}, LARGE_FIELDS)
+        }
+    except errors.PyMongoError as e:
+        metrics.error("mongo", op="similar_articles")
+        print(f"Error retrieving similar articles from MongoDB: {e}")
+        return []
+    return [dict(stored[key], score=score) for key, score in matches if key in stored]
 
-# Define a function to retrieve articles based on given keywords
-def retrieve_all(keywords):
-    global KEYWORDS
-    KEYWORDS = keywords
+
+# Function to run a ranked full-text search over the stored articles. The matches' content
+# comes from the body store unless `with_content` is False; with `enriched` only articles
+# that already have a summary match.
+@metrics.traced("mongo", op="search_local")
+def search_local(query, limit=10, with_content=True, match_all=False, enriched=False):
+    # mongomock, used in OFFLINE mode, has no text search
+    if OFFLINE or not query or not query.strip():
+        return []
+    try:
+        articles = list(
+            collection.find(text_filter(query, match_all, enriched), {"score": {"$meta": "textScore"}, "embedding": 0})
+            .sort([("score", {"$meta": "textScore"})])
+            .limit(limit)
+        )
+        if match_all:
+            articles = strong_matches(query, articles)
+        return attach_content(articles) if with_content else articles
+    except errors.PyMongoError as e:
+        metrics.error("mongo", op="search_local")
+        print(f"Error searching articles in MongoDB: {e}")
+        return []
+
+
+# Function to build the full-text filter for a query. By default any term matches; with
+# `match_all` each term is quoted, which MongoDB requires all of. With `enriched` articles
+# stored without a summary, e.g. by a harvest that skipped enrichment, are left out.
+def text_filter(query, match_all=False, enriched=False):
+    if match_all:
+        query = " ".join('"' + term.replace('"', '') + '"' for term in query.split())
+    query_filter = {"$text": {"$search": query}}
+    if enriched:
+        query_filter["summary"] = {"$exists": True}
+    return query_filter
+
+
+# Function to keep the text search results scoring at least LOCAL_MIN_SCORE per keyword
+def strong_matches(query, articles):
+    min_score = LOCAL_MIN_SCORE * len(query.split())
+    return [article for article in articles if article.get("score", 0) >= min_score]
+
+
+# Function to find the stored articles that answer a search as well as going upstream would.
+# Only enriched articles count: an article without a summary is fetched and enriched again.
+def search_local_first(keywords):
+    return search_local(keywords, limit=LOCAL_TARGET, match_all=True, enriched=True) if LOCAL_FIRST else []
+
+
+# Function to load the full content of a single article
+@metrics.traced("mongo", op="get_article_content")
+def get_article_content(article_id):
+    if not ObjectId.is_valid(article_id):
+        return None
+    try:
+        article = collection.find_one({"_id": ObjectId(article_id)}, {"key": 1, "content": 1})
+        if article and "content" not in article and article.get("key"):
+            article = load_bodies([article["key"]]).get(article["key"], {})
+    except errors.PyMongoError as e:
+        metrics.error("mongo", op="get_article_content")
+        print(f"Error retrieving article from MongoDB: {e}")
+        return None
+    return article.get("content") if article else None
+
+
+# Function to build the provider calls for a search
+def provider_calls(keywords):
+    return {
+        "Cornell Arxiv": (retrieve_cornell, {"max_results": RESULTS_PER_PROVIDER, "keywords": keywords}),
+        "Europe PMC": (retrieve_euro, {"page_size": RESULTS_PER_PROVIDER, "keywords": keywords}),
+        "IEEE Xplore": (retrieve_ieee, {"max_records": RESULTS_PER_PROVIDER, "keywords": keywords}),
+    }
 
 
+# Function to query every provider at once and collect whatever comes back within budget
+@metrics.traced("fetch_articles")
+def fetch_articles(keywords):
+    calls = provider_calls(keywords)
+    results, timings = fan_out(calls, PROVIDER_BUDGETS, default_budget=PROVIDER_TIMEOUT)
+
+    # Keep the provider order stable regardless of which one answered first
     articles = []
+    for name in calls:
+        articles.extend(results.get(name) or [])
+    return articles, timings
+
+
+# Function to log how long each provider took, counting the ones that ran out of budget
+# (failures are already counted by the provider's span)
+def log_timings(timings):
+    for name, timing in timings.items():
+        if timing["status"] == "timeout":
+            metrics.error("provider", provider=name, reason="timeout")
+    metrics.debug("provider_timings", timings=timings)
+
+
+# Define a function to retrieve articles based on given keywords. A search that is already
+# running for the same keywords is joined instead of being fetched and enriched again.
+def retrieve_all(keywords):
+    return search_flights.do(normalize_query(keywords), search_articles, keywords)
+
+
+@metrics.traced("retrieve_all")
+def search_articles(keywords):
+    local_articles = search_local_first(keywords)
+    if len(local_articles) >= LOCAL_TARGET:
+        return local_articles
+
+    articles, timings = fetch_articles(keywords)
+    log_timings(timings)
+
+    # Only enrich what the local corpus didn't already answer with
+    known = {article_key(article) for article in local_articles}
+    articles = [article for article in articles if article_key(article) not in known]
+
+    # Papers that several providers returned only need enriching once
+    duplicates = []
+    if EMBEDDINGS_ENABLED:
+        articles_to_enrich, duplicates = collapse_duplicates(articles)
+    else:
+        articles_to_enrich = articles
+
+    # Enrich several articles at once; the chat client enforces the rate limits
+    enrich_articles(articles_to_enrich)
+    for duplicate, original in duplicates:
+        duplicate.update({"summary": original["summary"], "topics": original["topics"]})
+    save_articles(articles, keywords)
+    if EMBEDDINGS_ENABLED:
+        index_articles(articles)
+
+
+    return local_articles + articles
 
 
-    def collect_articles(func, *args, **kwargs):
-        nonlocal articles
-        new_articles = func(*args, **kwargs)
-        if new_articles:
-            articles.extend(new_articles)
+# Streaming form of retrieve_all. Yields ("article", index, article) as soon as each
+# provider answers, ("enriched", index, article) as each article's summary and topics
+# are ready, and finally ("done", None, timings) once everything has finished.
+# Stored articles matching the query are streamed first, already enriched.
+# Articles are enriched one by one as they arrive, so ENRICHMENT_MODE=batch falls back to the
+# combined prompt per article and near-duplicates across providers are not collapsed: the
+# first copy is usually being enriched before its duplicate shows up.
+def iter_retrieve_all(keywords):
+    events = queue.Queue()
 
+    local_articles = search_local_first(keywords)
+    for index, article in enumerate(local_articles):
+        yield "article", index, article
+        yield "enriched", index, article
+    if len(local_articles) >= LOCAL_TARGET:
+        yield "done", None, {}
+        return
+    known = {article_key(article) for article in local_articles}
 
-    collect_articles(retrieve_cornell, max_results=2, keywords=KEYWORDS)
-    collect_articles(retrieve_euro, page_size=2, keywords=KEYWORDS)
-    collect_articles(retrieve_ieee, max_records=2, keywords=KEYWORDS)
+    def fetch():
+        for name, articles, timing in iter_fan_out(provider_calls(keywords), PROVIDER_BUDGETS, PROVIDER_TIMEOUT):
+            events.put(("provider", name, articles or [], timing))
+        events.put(("fetched", None, None, None))
 
+    def enrich(index, article):
+        try:
+            enrich_article(article)
+        finally:
+            events.put(("enriched", index, article, None))
+
+    threading.Thread(target=fetch, daemon=True).start()
+    timings = {}
+    processed_articles = []
+    fetching = True
+    count = len(local_articles)
+    enriched = len(local_articles)
+    try:
+        with ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="enrich") as pool:
+            while fetching or enriched < count:
+                kind, key, payload, timing = events.get()
+                if kind == "provider":
+                    timings[key] = timing
+                    for article in payload:
+                        if article_key(article) in known:
+                            continue
+                        # Hand out a copy, the original is updated by the enrichment thread
+                        yield "article", count, dict(article)
+                        pool.submit(enrich, count, article)
+                        count += 1
+                elif kind == "enriched":
+                    enriched += 1
+                    processed_articles.append(payload)
+                    yield "enriched", key, payload
+                else:
+                    fetching = False
+    finally:
+        # Save the whole search in one round-trip. If the client went away mid-stream, the
+        # pool has still finished the enrichments it was given; keep those too.
+        while True:
+            try:
+                kind, key, payload, timing = events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "enriched":
+                processed_articles.append(payload)
+        save_articles(processed_articles, keywords)
+    log_timings(timings)
+    yield "done", None, timings
+
+
+# Function to report latency, error and connection reuse metrics for every provider
+def provider_stats():
+    return {client.name: client.stats() for client in PROVIDER_CLIENTS}
 
-    processed_articles = [process_article(article) for article in articles]
 
+# Function to fold the cache and provider counters into the /metrics samples
+def collect_metrics():
+    samples = []
+    for result, count in enrichment_cache.stats().items():
+        if result in ("memory_hits", "store_hits", "misses"):
+            samples.append(("journalize_enrichment_cache_lookups_total", "counter", {"result": result}, count))
+    samples.append(("journalize_enrichment_cache_entries", "gauge", {}, len(enrichment_cache.memory)))
+    if response_cache:
+        for result, count in response_cache.stats().items():
+            if result != "hit_ratio":
+                samples.append(("journalize_response_cache_lookups_total", "counter", {"result": result}, count))
+    for client in PROVIDER_CLIENTS:
+        stats = client.stats()
+        labels = {"provider": client.name}
+        samples.append(("journalize_provider_requests_total", "counter", labels, stats["requests"]))
+        samples.append(("journalize_provider_errors_total", "counter", labels, stats["errors"]))
+        samples.append(("journalize_provider_connections_opened", "gauge", labels, stats["connections_opened"]))
+        samples.append(("journalize_provider_request_seconds", "histogram", labels, (
+            LATENCY_BUCKETS, list(stats["latency_histogram"].values()), stats["latency_sum_seconds"]
+        )))
+    return samples
 
-    return processed_articles
+
+metrics.register_collector(collect_metrics)
 
 
 # Define a function to format raw article results
@@ -257,24 +1171,143 @@ def format_results(raw_results):
 
     return formatted_results  # Return the list of formatted results
 
+# Function to run a queued search, reporting progress as articles arrive and are enriched
+def run_search_job(payload, report):
+    keywords = keyword_extractor.query(payload["query"])
+    articles = {}
+    enriched = 0
+    for event, index, data in iter_retrieve_all(keywords):
+        if event == "done":
+            continue
+        articles[index] = data
+        enriched += event == "enriched"
+        report({"articles": len(articles), "enriched": enriched})
+    return {"query": payload["query"], "keywords": keywords, "results": format_results([articles[index] for index in sorted(articles)])}
+
+
+# Functions run by the background workers for each kind of job
+JOB_HANDLERS = {"search": run_search_job}
+
+
+def chat_messages(user_input, context=None):
+    system = "You are a researcher explaining research papers based on questions asked to you."
+    if context:
+        system += (" Use the numbered papers from our library below when they are relevant and cite them"
+                   f" like [1]; say so if they don't cover the question.\n\n{context}")
+    return [
+        {"role": "system", "content": system},
+        {"role": "user", "content": f"Answer the following question in a few sentences: {user_input}"}
+    ]
+
+
+# Function to find the stored articles that best match a question: nearest embeddings when
+# the vector index is enabled, otherwise (or when it finds nothing) the full-text index
+def related_articles(question, k):
+    if EMBEDDINGS_ENABLED and len(vector_index):
+        try:
+            vector = llm.embed([question[:8000]], model=EMBEDDING_MODEL)[0]
+            keys = [key for key, score in vector_index.query(vector, k)]
+            stored = {
+                doc["key"]: doc
+                for doc in collection.find({"key": {"$in": keys}, "summary": {"$exists": True}}, LARGE_FIELDS)
+            }
+            articles = [stored[key] for key in keys if key in stored]
+            if articles:
+                return articles
+        except Exception as e:
+            print(f"Error finding related articles by embedding: {e}")
+    return search_local(question, limit=k, with_content=False)
+
+
+# Function to pack numbered article summaries, best match first, into at most `token_budget` tokens
+def pack_context(articles, token_budget):
+    blocks = []
+    used = 0
+    for article in articles:
+        if not article.get("summary"):
+            continue
+        block = (f"[{len(blocks) + 1}] {article.get('title', 'No title available')} ({article.get('source', 'Unknown source')})\n"
+                 f"Topics: {', '.join(article.get('topics', []))}\n"
+                 f"Summary: {article['summary']}")
+        cost = len(block) // 4 + 1
+        if used + cost > token_budget:
+            break
+        blocks.append(block)
+        used += cost
+    return "\n\n".join(blocks)
+
+
+# Function to get the library context for a question, cached by the normalized question
+@metrics.traced("chat_context")
+def chat_context(user_input):
+    normalized = normalize_query(user_input)
+    context = rag_context_cache.get(normalized)
+    metrics.inc("journalize_cache_lookups_total", cache="rag_context", result="miss" if context is None else "hit")
+    if context is None:
+        context = pack_context(related_articles(user_input, RAG_TOP_K), RAG_TOKEN_BUDGET)
+        rag_context_cache.set(normalized, context)
+    return context
+
+
+# Function to build the chat prompt for a question. In RAG mode it also returns the answer
+# cache key, which covers the question, the model and the context it was answered from.
+def build_chat(user_input):
+    if not CHAT_RAG:
+        return chat_messages(user_input), None
+    context = chat_context(user_input)
+    normalized = normalize_query(user_input)
+    answer_key = hashlib.sha256(f"{model_name()}\n{normalized}\n{context}".encode("utf-8")).hexdigest()
+    return chat_messages(user_input, context), answer_key
+
+
+# Function to look up the cached answer for a RAG prompt, counting hits and misses
+def cached_answer(answer_key):
+    if not answer_key:
+        return None
+    cached = rag_answer_cache.get(answer_key)
+    metrics.inc("journalize_cache_lookups_total", cache="rag_answer", result="miss" if cached is None else "hit")
+    return cached
+
+
+# Function to answer a chat question; identical questions already being answered share that answer
 def gpt_output(user_input):
+    return chat_flights.do((model_name(), normalize_query(user_input)), answer_chat, user_input)
+
+
+@metrics.traced("chat")
+def answer_chat(user_input):
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a researcher explaining research papers based on questions asked to you."},
-                {"role": "user", "content": f"Answer the following question in a few sentences: {user_input}"}
-            ],
-            max_tokens=100
-        )
+        messages, answer_key = build_chat(user_input)
+        cached = cached_answer(answer_key)
+        if cached is not None:
+            return cached
+        response = llm.create(messages=messages, max_tokens=100)
         # print(response)  # Debug print
         output = response.choices[0].message['content']
+        if answer_key:
+            rag_answer_cache.set(answer_key, output)
         return output
     except Exception as e:
+        metrics.error("chat")
         print(e)
         return {"error": "ChatBot failed"}
 
 
+# Streaming form of gpt_output, yielding the answer a few characters at a time as the model writes it
+def iter_gpt_output(user_input):
+    messages, answer_key = build_chat(user_input)
+    cached = cached_answer(answer_key)
+    if cached is not None:
+        yield cached
+        return
+    tokens = []
+    for token in llm.stream(messages=messages, max_tokens=100):
+        tokens.append(token)
+        yield token
+    if answer_key:
+        rag_answer_cache.set(answer_key, "".join(tokens))
+
+
 def chat():
     print("Welcome to the OpenAI Chatbot. Type 'quit' to exit.")
     while True:
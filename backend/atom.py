@@ -0,0 +1,64 @@
+from xml.etree import ElementTree
+
+# Entry fields we keep and the article keys they map to
+FIELDS = {"id": "url", "title": "title", "summary": "content"}
+
+
+# Function to drop the XML namespace from a tag, so both Atom-namespaced and bare feeds parse
+def local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+# Incremental parser for arXiv's Atom feed. Feed it the response body in chunks and it
+# returns the articles whose <entry> has been closed so far, keeping only the id, title and
+# summary of each one and dropping finished entries from the tree so memory stays flat.
+class ArxivAtomParser:
+    def __init__(self):
+        self.parser = ElementTree.XMLPullParser(events=("start", "end"))
+        self.root = None
+
+    def feed(self, chunk):
+        self.parser.feed(chunk)
+        return self._read()
+
+    def close(self):
+        self.parser.close()
+        return self._read()
+
+    def _read(self):
+        articles = []
+        for event, element in self.parser.read_events():
+            if event == "start":
+                if self.root is None:
+                    self.root = element
+                continue
+            if local_name(element.tag) != "entry":
+                continue
+
+            fields = {}
+            for child in element:
+                name = local_name(child.tag)
+                if name in FIELDS:
+                    fields[FIELDS[name]] = "".join(child.itertext()).strip()
+            articles.append({
+                "source": "Cornell Arxiv",
+                "url": fields.get("url", ''),
+                "title": fields.get("title", 'No title available'),
+                "content": fields.get("content", 'No summary available')
+            })
+
+            try:
+                self.root.remove(element)
+            except ValueError:
+                # Not a direct child of the feed; at least free its contents
+                element.clear()
+        return articles
+
+
+# Function to parse arXiv articles from an iterable of byte or text chunks, yielding each
+# article as soon as its entry is complete
+def iter_arxiv_entries(chunks):
+    parser = ArxivAtomParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
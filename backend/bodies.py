@@ -0,0 +1,34 @@
+import zlib
+from bson import Binary
+
+# Article fields kept in the body store rather than in the article metadata. They are the
+# bulk of each document and only needed when one article is opened or compared.
+BODY_FIELDS = ("content", "embedding")
+
+
+# Function to split the body fields out of an article; returns {} when it has none
+def body_fields(article):
+    return {field: article[field] for field in BODY_FIELDS if field in article}
+
+
+# Function to build the stored form of an article body: the content zlib-compressed and
+# the embedding as is, as floats barely compress
+def pack_body(fields, level=6):
+    document = {}
+    if "content" in fields:
+        document["content"] = Binary(zlib.compress(str(fields["content"]).encode("utf-8"), level))
+        document["codec"] = "zlib"
+    if "embedding" in fields:
+        document["embedding"] = fields["embedding"]
+    return document
+
+
+# Function to turn a stored body back into its fields
+def unpack_body(document):
+    fields = {}
+    if document.get("content") is not None:
+        content = document["content"]
+        fields["content"] = zlib.decompress(bytes(content)).decode("utf-8") if document.get("codec") == "zlib" else content
+    if "embedding" in document:
+        fields["embedding"] = document["embedding"]
+    return fields
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+
+# Thread-safe in-process LRU cache; entries expire after `ttl` seconds when one is given
+class LRUCache:
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.data:
+                return None
+            value, stored_at = self.data[key]
+            if self.ttl is not None and time.monotonic() - stored_at >= self.ttl:
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (value, time.monotonic())
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def __len__(self):
+        return len(self.data)
+
+
+# Persistent key/value tier stored in a MongoDB collection, one document per key. With a
+# `ttl` in seconds each document carries an `expires_at` date; a TTL index on it (see
+# api.ensure_indexes) lets MongoDB delete expired entries, which are ignored until then.
+class MongoStore:
+    def __init__(self, collection, ttl=None):
+        self.collection = collection
+        self.ttl = ttl
+
+    def get(self, key):
+        try:
+            doc = self.collection.find_one({"_id": key})
+        except Exception as e:
+            print(f"Error reading cache entry from MongoDB: {e}")
+            return None
+        if not doc:
+            return None
+        expires_at = doc.get("expires_at")
+        if expires_at is not None:
+            # PyMongo returns naive UTC datetimes unless the client is timezone-aware
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            if expires_at <= datetime.now(timezone.utc):
+                return None
+        return doc["value"]
+
+    def set(self, key, value):
+        document = {"value": value}
+        if self.ttl is not None:
+            document["expires_at"] = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        try:
+            self.collection.update_one({"_id": key}, {"$set": document}, upsert=True)
+        except Exception as e:
+            print(f"Error writing cache entry to MongoDB: {e}")
+
+
+# Two-tier cache for LLM enrichment results: an in-process LRU in front of a
+# persistent store, keyed by a hash of what was asked and how it was asked
+class EnrichmentCache:
+    def __init__(self, memory, store=None):
+        self.memory = memory
+        self.store = store
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "store_hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(kind, content, model, prompt_version):
+        payload = json.dumps([kind, model, prompt_version, content], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        if self.store is not None:
+            value = self.store.get(key)
+            if value is not None:
+                self._count("store_hits")
+                self.memory.set(key, value)
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.store is not None:
+            self.store.set(key, value)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = stats["memory_hits"] + stats["store_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((lookups - stats["misses"]) / lookups, 3) if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        return stats
+
+
+# Cache of parsed provider responses keyed on (provider, normalized query, page size).
+# Entries keep the response's ETag/Last-Modified so a stale entry can be revalidated
+# with a conditional request instead of being fetched and parsed again. The backend
+# is anything with get/set: an LRUCache for one process or a MongoStore shared by workers.
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "revalidated": 0, "misses": 0}
+
+    @staticmethod
+    def key(provider, query, page_size):
+        normalized = " ".join(str(query).lower().split())
+        payload = json.dumps([provider, normalized, page_size], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    # Function to look up an entry; returns (entry, fresh) or (None, False)
+    def get(self, key, ttl):
+        entry = self.backend.get(key)
+        if entry is None:
+            return None, False
+        return entry, time.time() - entry["stored_at"] < ttl
+
+    def set(self, key, value, etag=None, last_modified=None):
+        self.backend.set(key, {
+            "value": value,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": time.time()
+        })
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        lookups = sum(stats.values())
+        stats["hit_ratio"] = round((stats["hits"] + stats["revalidated"]) / lookups, 3) if lookups else 0.0
+        return stats
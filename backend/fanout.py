@@ -0,0 +1,97 @@
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from backend.services import services
+
+# Shared pool for provider calls. A provider that overruns its budget keeps
+# running here in the background instead of blocking the request that gave up on it.
+# It is a service so a forked worker starts its own pool: the parent's threads don't
+# exist in the child, and a pool inherited without them never runs anything.
+services.register("fanout_pool", lambda: ThreadPoolExecutor(
+    max_workers=int(os.getenv('FANOUT_WORKERS', 16)),
+    thread_name_prefix="fanout"
+))
+_executor = services.proxy("fanout_pool")
+
+
+# time.perf_counter() deadline of the fan-out call running in this context, if any
+call_deadline = contextvars.ContextVar("call_deadline", default=None)
+
+
+# Function to get the seconds left before the current fan-out call's deadline; None outside one.
+# Calls that retry, such as the provider clients, use it to stop once the caller has given up.
+def time_left():
+    deadline = call_deadline.get()
+    return None if deadline is None else deadline - time.perf_counter()
+
+
+# Function to run a single call and measure how long it took
+def _timed_call(func, kwargs, deadline):
+    started = time.perf_counter()
+    if started >= deadline:
+        # It waited for a free thread until its budget ran out; the caller has moved on
+        raise TimeoutError("budget ran out before the call started")
+    call_deadline.set(deadline)
+    value = func(**kwargs)
+    return value, time.perf_counter() - started
+
+
+# Function to run several calls at once, each with its own time budget in seconds.
+# `calls` maps a name to a (function, kwargs) pair and `budgets` maps the same
+# names to their budget (falling back to `default_budget`). Yields a
+# (name, value, timing) tuple for each call as soon as it finishes, fails or
+# runs out of budget; the value is None unless the timing status is "ok".
+def iter_fan_out(calls, budgets=None, default_budget=10.0):
+    budgets = budgets or {}
+    started = time.perf_counter()
+    deadlines = {name: started + budgets.get(name, default_budget) for name in calls}
+    # Each call runs in a copy of the caller's context so its spans join the caller's trace
+    names = {
+        _executor.submit(contextvars.copy_context().run, _timed_call, func, kwargs, deadlines[name]): name
+        for name, (func, kwargs) in calls.items()
+    }
+
+    pending = set(names)
+    while pending:
+        next_deadline = min(deadlines[names[future]] for future in pending)
+        done, _ = wait(pending, timeout=max(0.0, next_deadline - time.perf_counter()), return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            name = names[future]
+            try:
+                value, elapsed = future.result()
+                yield name, value, {"status": "ok", "seconds": round(elapsed, 3)}
+            except Exception as e:
+                print(f"Error retrieving from {name}: {e}")
+                yield name, None, {"status": "error", "seconds": round(time.perf_counter() - started, 3)}
+
+        now = time.perf_counter()
+        for future in [f for f in pending if not f.done() and deadlines[names[f]] <= now]:
+            pending.discard(future)
+            future.cancel()
+            name = names[future]
+            yield name, None, {"status": "timeout", "seconds": round(deadlines[name] - started, 3)}
+
+
+# Function to run several calls at once and wait for all of them (see iter_fan_out).
+# Returns a dict of results for the calls that finished in time and a dict of per-call timings.
+def fan_out(calls, budgets=None, default_budget=10.0):
+    results = {}
+    timings = {}
+    for name, value, timing in iter_fan_out(calls, budgets, default_budget):
+        timings[name] = timing
+        if timing["status"] == "ok":
+            results[name] = value
+    return results, timings
+
+
+# Function to apply `func` to every item with at most `max_workers` calls in flight,
+# returning the results in the same order as the items
+def bounded_map(func, items, max_workers):
+    items = list(items)
+    if max_workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    calls = [(contextvars.copy_context(), item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix="enrich") as pool:
+        return list(pool.map(lambda call: call[0].run(func, call[1]), calls))
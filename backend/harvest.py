@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend import api
+from backend.llm import TokenBucket
+from backend.atom import iter_arxiv_entries
+
+# Request rates each provider asks API clients to stay under: arXiv wants one
+# request every three seconds, IEEE allows ten calls a second
+PROVIDER_LIMITS = {
+    "arxiv": TokenBucket(per_minute=20, capacity=1),
+    "europepmc": TokenBucket(per_minute=600, capacity=1),
+    "ieee": TokenBucket(per_minute=600, capacity=1),
+}
+
+# Largest page each provider serves in one request
+MAX_PAGE_SIZES = {"arxiv": 1000, "europepmc": 1000, "ieee": 200}
+
+
+# Function to fail loudly on a bad page so the harvest can be resumed from its checkpoint
+def check(response, provider):
+    if response.status_code != 200:
+        raise RuntimeError(f"{provider} returned HTTP {response.status_code}")
+    return response
+
+
+# Function to stream arXiv result pages using `start` offsets. Results are sorted by
+# submission date, oldest first, so new papers land after the checkpointed offset.
+def iter_arxiv_pages(keywords, page_size, position=None):
+    start = position or 0
+    while True:
+        PROVIDER_LIMITS["arxiv"].acquire()
+        response = check(api.arxiv_client.get(params={
+            "search_query": f"all:{keywords}",
+            "start": start,
+            "max_results": page_size,
+            "sortBy": "submittedDate",
+            "sortOrder": "ascending"
+        }, stream=True), "arxiv")
+        # Parse the feed as it downloads instead of buffering the whole page first
+        articles = list(iter_arxiv_entries(response.iter_content(chunk_size=65536)))
+        start += len(articles)
+        yield articles, start
+        if len(articles) < page_size:
+            return
+
+
+# Function to stream Europe PMC result pages using `cursorMark`
+def iter_euro_pages(keywords, page_size, position=None):
+    cursor = position or "*"
+    while True:
+        PROVIDER_LIMITS["europepmc"].acquire()
+        response = check(api.euro_client.get(params={
+            "query": keywords,
+            "format": "json",
+            "pageSize": page_size,
+            "cursorMark": cursor
+        }), "europepmc")
+        articles = api.parse_euro(response)
+        next_cursor = response.json().get("nextCursorMark", cursor)
+        yield articles, next_cursor
+        # Europe PMC repeats the cursor once the last page has been served
+        if not articles or next_cursor == cursor:
+            return
+        cursor = next_cursor
+
+
+# Function to stream IEEE Xplore result pages using `start_record` (1-based)
+def iter_ieee_pages(keywords, page_size, position=None):
+    start_record = position or 1
+    while True:
+        PROVIDER_LIMITS["ieee"].acquire()
+        response = check(api.ieee_client.get(params={
+            "apikey": api.ieee_api_key,
+            "format": "json",
+            "max_records": page_size,
+            "start_record": start_record,
+            "sort_order": "asc",
+            "sort_field": "article_number",
+            "querytext": keywords
+        }), "ieee")
+        articles = api.parse_ieee(response)
+        start_record += len(articles)
+        yield articles, start_record
+        if len(articles) < page_size:
+            return
+
+
+PAGERS = {
+    "arxiv": iter_arxiv_pages,
+    "europepmc": iter_euro_pages,
+    "ieee": iter_ieee_pages,
+}
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    if not path:
+        return
+    # Write to a temporary file first so an interruption never corrupts the checkpoint
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temporary, path)
+
+
+# Function to harvest up to `limit` results for a query from one provider, page by page.
+# Each page is saved (and optionally enriched) before the next one is requested and the
+# position is checkpointed after every page, so memory stays flat and an interrupted
+# harvest resumes where it stopped. Yields each saved page of articles.
+def iter_harvest(provider, keywords, limit=None, page_size=None, checkpoint_path=None, enrich=False):
+    page_size = min(page_size or MAX_PAGE_SIZES[provider], MAX_PAGE_SIZES[provider])
+    checkpoint = load_checkpoint(checkpoint_path)
+    key = f"{provider}:{keywords}"
+    state = checkpoint.get(key, {})
+    harvested = state.get("harvested", 0)
+    if limit is not None and harvested >= limit:
+        return
+
+    for articles, position in PAGERS[provider](keywords, page_size, state.get("position")):
+        if limit is not None:
+            articles = articles[:limit - harvested]
+        if enrich:
+            api.enrich_articles(articles)
+        api.save_articles(articles, keywords)
+
+        harvested += len(articles)
+        checkpoint[key] = {"position": position, "harvested": harvested}
+        save_checkpoint(checkpoint_path, checkpoint)
+        yield articles
+        if limit is not None and harvested >= limit:
+            return
+
+
+# Harvest from the command line: python -m backend.harvest "query" --provider arxiv --limit 1000
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Harvest a large result set for a query into MongoDB")
+    parser.add_argument("keywords")
+    parser.add_argument("--provider", choices=sorted(PAGERS), default="arxiv")
+    parser.add_argument("--limit", type=int, help="stop after this many articles")
+    parser.add_argument("--page-size", type=int, help="results per request (capped at the provider maximum)")
+    parser.add_argument("--checkpoint", default="harvest_checkpoint.json", help="file used to resume interrupted harvests")
+    parser.add_argument("--enrich", action="store_true", help="summarize and tag each page with OpenAI before saving")
+    args = parser.parse_args()
+
+    total = 0
+    for page in iter_harvest(args.provider, args.keywords, args.limit, args.page_size, args.checkpoint, args.enrich):
+        total += len(page)
+        print(f"Saved {len(page)} articles ({total} this run)")
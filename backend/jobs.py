@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import closing
+
+
+# Durable job queue stored in a local SQLite file, so it needs no external services and
+# can be shared by the web process and any number of separate worker processes. A claimed
+# job is leased to its worker for `lease` seconds and the worker keeps renewing it; a job
+# whose lease runs out belonged to a worker that died and goes back in the queue. Finished
+# jobs are deleted `retention` seconds after they finish.
+class JobQueue:
+    def __init__(self, path, lease=300.0, retention=7 * 86400.0):
+        self.path = path
+        self.lease = lease
+        self.retention = retention
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    progress TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    lease_until REAL
+                )
+            """)
+            # Queues created before leases existed
+            if "lease_until" not in [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]:
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    def _connect(self):
+        # Autocommit mode; claim() opens its own write transaction
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def enqueue(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload), now, now)
+            )
+        return job_id
+
+    # Function to take the oldest queued job and mark it running; returns None if there is none
+    def claim(self):
+        with closing(self._connect()) as conn:
+            # IMMEDIATE takes the write lock up front so two workers can't claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, kind, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', updated_at = ?, lease_until = ? WHERE id = ?",
+                (now, now + self.lease, row[0])
+            )
+            conn.execute("COMMIT")
+        return {"id": row[0], "kind": row[1], "payload": json.loads(row[2])}
+
+    def _update(self, job_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with closing(self._connect()) as conn:
+            conn.execute(
+                f"UPDATE jobs SET {columns}, updated_at = ? WHERE id = ?",
+                (*fields.values(), time.time(), job_id)
+            )
+
+    def report(self, job_id, progress):
+        self._update(job_id, progress=json.dumps(progress))
+
+    def complete(self, job_id, result):
+        self._update(job_id, status="done", result=json.dumps(result))
+
+    def fail(self, job_id, error):
+        self._update(job_id, status="failed", error=error)
+
+    # Function to extend the leases of jobs a live worker is still running
+    def renew(self, job_ids):
+        if not job_ids:
+            return
+        with closing(self._connect()) as conn:
+            conn.executemany(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'",
+                [(time.time() + self.lease, job_id) for job_id in job_ids]
+            )
+
+    # Function to put jobs left running by a worker that died back in the queue, i.e. whose
+    # lease ran out (rows from before leases use their last update); returns how many
+    def requeue_expired(self):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ?, lease_until = NULL "
+                "WHERE status = 'running' AND COALESCE(lease_until, updated_at + ?) < ?",
+                (now, self.lease, now)
+            ).rowcount
+
+    # Function to put every running job back in the queue; only safe when no worker is running
+    def requeue_running(self):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ?, lease_until = NULL WHERE status = 'running'",
+                (time.time(),)
+            )
+
+    # Function to delete jobs that finished more than `retention` seconds ago; returns how many
+    def prune(self):
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - self.retention,)
+            ).rowcount
+
+    def get(self, job_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, progress, result, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "progress": json.loads(row[3]) if row[3] else None,
+            "result": json.loads(row[4]) if row[4] else None,
+            "error": row[5],
+            "created_at": row[6],
+            "updated_at": row[7]
+        }
+
+
+# Pool of worker threads running queued jobs. `handlers` maps a job kind to a
+# function called as handler(payload, report) whose return value is the job result;
+# `report` stores a JSON-serializable progress update. A housekeeping thread renews the
+# leases of the jobs being run, and on start and then every `housekeeping_interval`
+# seconds requeues jobs whose lease ran out and prunes old finished ones.
+class WorkerPool:
+    def __init__(self, queue, handlers, workers=2, poll_interval=1.0, housekeeping_interval=None):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        # Often enough that a live worker's lease is renewed well before it runs out
+        self.housekeeping_interval = housekeeping_interval or min(60.0, queue.lease / 3)
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.threads = []
+        self.running = set()
+        self.running_lock = threading.Lock()
+
+    def start(self):
+        if self.threads or not self.workers:
+            return
+        self.stopping.clear()
+        self.housekeep()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        thread = threading.Thread(target=self._housekeeping, name="job-housekeeping", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    # Function to renew this pool's leases, requeue jobs of dead workers and prune finished jobs
+    def housekeep(self):
+        try:
+            with self.running_lock:
+                running = list(self.running)
+            self.queue.renew(running)
+            requeued = self.queue.requeue_expired()
+            if requeued:
+                print(f"Requeued {requeued} jobs left running by a worker that stopped")
+                self.notify()
+            self.queue.prune()
+        except sqlite3.Error as e:
+            print(f"Error maintaining the job queue: {e}")
+
+    def _housekeeping(self):
+        while not self.stopping.wait(self.housekeeping_interval):
+            self.housekeep()
+
+    # Function to wake idle workers right away after a job is enqueued
+    def notify(self):
+        self.wakeup.set()
+
+    # Function to let the workers finish their current job and exit
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def _run(self):
+        while not self.stopping.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+                continue
+            self._execute(job)
+
+    def _execute(self, job):
+        with self.running_lock:
+            self.running.add(job["id"])
+        try:
+            self._handle(job)
+        finally:
+            with self.running_lock:
+                self.running.discard(job["id"])
+
+    def _handle(self, job):
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            self.queue.fail(job["id"], f"No handler for job kind '{job['kind']}'")
+            return
+        try:
+            result = handler(job["payload"], lambda progress: self.queue.report(job["id"], progress))
+        except Exception as e:
+            print(f"Job {job['id']} failed: {e}")
+            self.queue.fail(job["id"], str(e))
+            return
+        self.queue.complete(job["id"], result)
+
+
+# Run standalone worker processes: python -m backend.jobs --workers 4
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background job workers")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--recover", action="store_true",
+                        help="requeue every running job now instead of once its lease runs out; only use when no other worker is running")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+    from backend.api import job_queue, JOB_HANDLERS
+
+    if args.recover:
+        job_queue.requeue_running()
+    pool = WorkerPool(job_queue, JOB_HANDLERS, workers=args.workers)
+    pool.start()
+    print(f"Running {pool.workers} job workers on {job_queue.path}")
+    for thread in pool.threads:
+        thread.join()
@@ -0,0 +1,81 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import textrazor
+from backend.cache import LRUCache
+from backend import metrics
+
+# Common English words that never make useful search keywords
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further had
+has have having he her here hers herself him himself his how i if in into is it its itself just
+me more most my myself no nor not now of off on once only or other our ours ourselves out over own
+paper papers research same she should so some study studies such than that the their theirs them
+themselves then there these they this those through to too under until up very was we were what
+when where which while who whom why will with would you your yours yourself yourselves
+""".split())
+
+
+# Function to turn extracted terms into a canonical keyword list: lowercase single
+# words, without duplicates, in sorted order so equal questions give equal queries
+def canonicalize(terms):
+    words = {word.lower() for term in terms for word in term.split()}
+    return sorted(word for word in words if word)
+
+
+# Function to pick keywords out of a question without any remote service
+def local_keywords(question):
+    words = re.findall(r"[A-Za-z0-9][A-Za-z0-9\-]+", question.lower())
+    return canonicalize(word for word in words if word not in STOPWORDS)
+
+
+# Turns free-text research questions into canonical search keywords. Entities come from
+# TextRazor through one persistent client per thread, answers are cached by normalized
+# question, and the local extractor is used when TextRazor is slow, failing or not set up.
+class KeywordExtractor:
+    def __init__(self, api_key=None, timeout=3.0, cache_size=1024, ttl=86400):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.cache = LRUCache(maxsize=cache_size, ttl=ttl)
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="textrazor")
+        self.clients = threading.local()
+
+    @metrics.traced("textrazor")
+    def _remote(self, question):
+        if not hasattr(self.clients, "client"):
+            self.clients.client = textrazor.TextRazor(api_key=self.api_key, extractors=["entities"])
+        response = self.clients.client.analyze(question)
+        return [entity.english_id for entity in response.entities() if entity.english_id]
+
+    @metrics.traced("keywords")
+    def extract(self, question):
+        normalized = " ".join(question.lower().split())
+        cached = self.cache.get(normalized)
+        metrics.inc("journalize_cache_lookups_total", cache="keywords", result="miss" if cached is None else "hit")
+        if cached is not None:
+            return list(cached)
+
+        keywords = []
+        remote_ok = False
+        if self.api_key:
+            future = self.executor.submit(self._remote, question)
+            try:
+                keywords = canonicalize(future.result(timeout=self.timeout))
+                remote_ok = True
+            except TimeoutError:
+                metrics.error("textrazor")
+                print(f"TextRazor took longer than {self.timeout}s, using local keywords")
+            except Exception as e:
+                print(f"TextRazor failed, using local keywords: {e}")
+
+        if not keywords:
+            keywords = local_keywords(question)
+        # Only remember TextRazor's answers so a transient failure isn't cached
+        if remote_ok:
+            self.cache.set(normalized, tuple(keywords))
+        return keywords
+
+    # Function to build the provider query for a question, falling back to the question itself
+    def query(self, question):
+        return " ".join(self.extract(question)) or question.strip()
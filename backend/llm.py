@@ -0,0 +1,177 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import openai
+from openai.openai_object import OpenAIObject
+from backend import metrics
+
+
+# Token bucket that refills continuously at `per_minute` units per minute
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# Rate limiter that respects both the requests-per-minute and tokens-per-minute quotas
+class RateLimiter:
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def acquire(self, tokens):
+        self.requests.acquire(1)
+        self.tokens.acquire(tokens)
+
+
+# Rough token count for a chat request: ~4 characters per token plus the completion budget
+def estimate_tokens(messages, max_tokens):
+    return sum(len(m.get("content", "")) for m in messages) // 4 + max_tokens
+
+
+# Function to decide whether an OpenAI error is worth retrying (rate limits and server errors)
+def is_retryable(error):
+    if isinstance(error, (openai.error.RateLimitError, openai.error.ServiceUnavailableError,
+                          openai.error.Timeout, openai.error.APIConnectionError)):
+        return True
+    status = getattr(error, "http_status", None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+# Function to call `func`, retrying retryable errors with full-jitter exponential backoff
+def call_with_retry(func, max_retries=5, base_delay=0.5, max_delay=20.0):
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            metrics.inc("journalize_retries_total", target="openai")
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+            attempt += 1
+
+
+# Function to count the tokens a completion used, as reported by the API
+def record_usage(model, response):
+    usage = response.get("usage") if isinstance(response, dict) else None
+    if usage:
+        metrics.inc("journalize_llm_tokens_total", usage.get("prompt_tokens", 0), model=model, kind="prompt")
+        metrics.inc("journalize_llm_tokens_total", usage.get("completion_tokens", 0), model=model, kind="completion")
+
+
+# OpenAI client with a shared concurrency limit, RPM/TPM rate limiting and retries.
+# Its settings, including the API key, go with every request instead of the module-global
+# `openai` configuration. The library keeps a pooled keep-alive session per thread itself;
+# this version can't be given one per call, and sharing one through the global
+# `openai.requestssession` would let each thread close it when its own copy expires.
+class ChatClient:
+    def __init__(self, model="gpt-3.5-turbo", rpm=500, tpm=90000, concurrency=4, max_retries=5, api_key=None):
+        self.model = model
+        self.api_key = api_key
+        self.limiter = RateLimiter(rpm, tpm)
+        self.in_flight = threading.BoundedSemaphore(concurrency)
+        self.max_retries = max_retries
+
+    def create(self, messages, max_tokens, **kwargs):
+        def attempt():
+            self.limiter.acquire(estimate_tokens(messages, max_tokens))
+            with self.in_flight:
+                return openai.ChatCompletion.create(
+                    api_key=self.api_key,
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    **kwargs
+                )
+        with metrics.span("openai", call="chat"):
+            response = call_with_retry(attempt, max_retries=self.max_retries)
+        record_usage(self.model, response)
+        return response
+
+    # Function to stream a chat completion, yielding the text of each token as it arrives.
+    # Only opening the stream is retried, and the in-flight slot is held until it ends.
+    def stream(self, messages, max_tokens, **kwargs):
+        def attempt():
+            self.limiter.acquire(estimate_tokens(messages, max_tokens))
+            self.in_flight.acquire()
+            try:
+                return openai.ChatCompletion.create(
+                    api_key=self.api_key,
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    **kwargs
+                )
+            except Exception:
+                self.in_flight.release()
+                raise
+        with metrics.span("openai", call="stream_open"):
+            chunks = call_with_retry(attempt, max_retries=self.max_retries)
+        # Streamed replies carry no usage; each delta is about one completion token
+        streamed = 0
+        try:
+            for chunk in chunks:
+                token = chunk["choices"][0]["delta"].get("content") if chunk["choices"] else None
+                if token:
+                    streamed += 1
+                    yield token
+        finally:
+            self.in_flight.release()
+            metrics.inc("journalize_llm_tokens_total", streamed, model=self.model, kind="completion")
+
+    def embed(self, texts, model="text-embedding-ada-002"):
+        def attempt():
+            self.limiter.acquire(sum(len(text) for text in texts) // 4)
+            with self.in_flight:
+                return openai.Embedding.create(api_key=self.api_key, model=model, input=texts)
+        with metrics.span("openai", call="embed"):
+            response = call_with_retry(attempt, max_retries=self.max_retries)
+        record_usage(model, response)
+        # The API may return the embeddings out of order
+        return [item["embedding"] for item in sorted(response["data"], key=lambda item: item["index"])]
+
+
+# Stand-in for ChatClient in offline mode. Every request gets a fixed, well-formed local
+# reply (JSON when the prompt asks for it) and embeddings are derived from a hash of the text.
+class FakeChatClient:
+    def __init__(self, model="offline"):
+        self.model = model
+
+    def _reply(self, messages):
+        if "only replies with JSON" in messages[0]["content"]:
+            return json.dumps({"summary": "Offline summary.", "topics": ["Offline"]})
+        return "Offline reply."
+
+    def create(self, messages, max_tokens, **kwargs):
+        return OpenAIObject.construct_from({
+            "model": self.model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self._reply(messages)}}]
+        })
+
+    def stream(self, messages, max_tokens, **kwargs):
+        yield from re.findall(r"\S+\s*", self._reply(messages))
+
+    def embed(self, texts, model=None):
+        return [[byte / 255 for byte in hashlib.sha256(text.encode("utf-8")).digest()] for text in texts]
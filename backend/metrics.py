@@ -0,0 +1,216 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds of the stage duration histogram buckets
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf"))
+
+# Write one JSON line per finished span, with trace and parent ids, to stderr. Set
+# METRICS_LOG_LEVEL=DEBUG to also log per-request detail such as provider timings.
+JSON_LOGS = os.getenv('METRICS_JSON_LOGS', '0') == '1'
+
+logger = logging.getLogger("journalize.trace")
+if JSON_LOGS:
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(os.getenv('METRICS_LOG_LEVEL', 'INFO').upper())
+    logger.propagate = False
+
+# (trace id, span id) of the span running in this thread or task; only tracked for the JSON logs
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+def format_bound(bound):
+    return "+Inf" if bound == float("inf") else str(bound)
+
+
+# In-process counters and histograms, rendered in the Prometheus text format. Collectors
+# are called at render time to fold in numbers other objects already keep, such as cache
+# and provider stats; each returns (name, type, labels, value) samples, where a histogram
+# value is (bucket bounds, per-bucket counts, sum).
+class Registry:
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            counts, total = self.histograms.get(key) or ([0] * len(STAGE_BUCKETS), 0.0)
+            for i, bound in enumerate(STAGE_BUCKETS):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self.histograms[key] = (counts, total + value)
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    # Function to read one counter, or a histogram's observation count; mostly for tests
+    def value(self, name, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            if key in self.histograms:
+                return sum(self.histograms[key][0])
+            return self.counters.get(key, 0)
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def samples(self):
+        with self.lock:
+            families = {}
+            for (name, labels), value in self.counters.items():
+                families.setdefault(name, ("counter", []))[1].append((labels, value))
+            for (name, labels), (counts, total) in self.histograms.items():
+                families.setdefault(name, ("histogram", []))[1].append((labels, (STAGE_BUCKETS, list(counts), total)))
+        for collector in self.collectors:
+            try:
+                for name, kind, labels, value in collector():
+                    families.setdefault(name, (kind, []))[1].append((label_key(labels), value))
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        return families
+
+    def render(self):
+        lines = []
+        for name, (kind, samples) in sorted(self.samples().items()):
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind != "histogram":
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+                    continue
+                bounds, counts, total = value
+                cumulative = 0
+                for bound, count in zip(bounds, counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', format_bound(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {round(total, 6)}")
+                lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+# Metrics shared by the whole backend
+registry = Registry()
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+
+# Function to count a failure in a pipeline stage, including ones the stage handles itself
+def error(stage, **labels):
+    registry.inc("journalize_errors_total", stage=stage, **labels)
+
+
+def log_span(stage, labels, trace, parent, seconds, status):
+    logger.info(json.dumps(dict(
+        labels,
+        ts=round(time.time(), 3),
+        trace_id=trace[0],
+        span_id=trace[1],
+        parent_id=parent[1] if parent else None,
+        stage=stage,
+        seconds=round(seconds, 6),
+        status=status
+    )))
+
+
+# Function to log one JSON line of per-request detail at debug level, in the current trace
+def debug(event, **fields):
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    trace = current_span.get()
+    logger.debug(json.dumps(dict(
+        fields,
+        ts=round(time.time(), 3),
+        trace_id=trace[0] if trace else None,
+        event=event
+    )))
+
+
+# Context manager timing one stage of a request into journalize_stage_seconds. An exception
+# leaving the block is counted in journalize_errors_total. With JSON logs on, nested spans
+# share their trace id, also across asyncio tasks and the fan-out threads.
+@contextmanager
+def span(stage, **labels):
+    parent = trace = token = None
+    if JSON_LOGS:
+        parent = current_span.get()
+        trace = (parent[0] if parent else os.urandom(8).hex(), os.urandom(8).hex())
+        token = current_span.set(trace)
+    status = "ok"
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        status = "error"
+        error(stage, **labels)
+        raise
+    except BaseException:
+        # Cancelled, e.g. a provider call that ran out of budget; counted by whoever cancelled it
+        status = "cancelled"
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        registry.observe("journalize_stage_seconds", seconds, stage=stage, **labels)
+        if token is not None:
+            current_span.reset(token)
+            log_span(stage, labels, trace, parent, seconds, status)
+
+
+# Decorator running every call of a function, or coroutine function, in a span
+def traced(stage, **labels):
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage, **labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def register_collector(collector):
+    registry.register_collector(collector)
+
+
+def render():
+    return registry.render()
@@ -0,0 +1,111 @@
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pymongo import UpdateOne, errors
+from backend import api
+from backend.bodies import BODY_FIELDS, body_fields, pack_body
+from backend.keywords import canonicalize
+
+
+# Function to move the content and embedding of every article still storing them inline into
+# the body store, `batch_size` articles per round-trip. Bodies are written before they are
+# removed from the articles, so an interrupted run loses nothing and can simply be rerun.
+# Articles saved before keys existed are given their key first; one whose key is already
+# taken keeps its body inline. Yields running totals after each batch.
+def iter_migrate(batch_size=500, dry_run=False):
+    totals = {"articles": 0, "raw_bytes": 0, "compressed_bytes": 0, "skipped": 0}
+    inline = {"$or": [{field: {"$exists": True}} for field in BODY_FIELDS]}
+    projection = {"key": 1, "url": 1, "doi": 1, "title": 1, **{field: 1 for field in BODY_FIELDS}}
+    last_id = None
+    while True:
+        query = dict(inline, _id={"$gt": last_id}) if last_id else inline
+        batch = list(api.collection.find(query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            return
+        last_id = batch[-1]["_id"]
+
+        body_operations = []
+        article_operations = []
+        claimed = set()
+        for article in batch:
+            key = article.get("key") or api.article_key(article)
+            if not article.get("key") and (key in claimed or api.collection.find_one({"key": key}, {"_id": 1})):
+                totals["skipped"] += 1
+                continue
+            claimed.add(key)
+            fields = body_fields(article)
+            body = pack_body(fields, api.BODY_COMPRESSION_LEVEL)
+            if "embedding" in body:
+                body["embedded_at"] = datetime.now(timezone.utc)
+            totals["raw_bytes"] += len(str(fields.get("content", "")).encode("utf-8"))
+            totals["compressed_bytes"] += len(body.get("content", b""))
+            body_operations.append(UpdateOne({"_id": key}, {"$set": body}, upsert=True))
+            update = {"$unset": {field: "" for field in fields}}
+            if not article.get("key"):
+                update["$set"] = {"key": key}
+            article_operations.append(UpdateOne({"_id": article["_id"]}, update))
+
+        if not dry_run and body_operations:
+            api.bodies.bulk_write(body_operations, ordered=False)
+            api.collection.bulk_write(article_operations, ordered=False)
+        totals["articles"] += len(article_operations)
+        yield dict(totals)
+
+
+# Function to turn the `keywords` of articles saved when it held one search's query string
+# into the canonical keyword array new searches add to. Returns how many were converted.
+def migrate_keywords(batch_size=500, dry_run=False):
+    converted = 0
+    operations = []
+    # $type also matches arrays holding a string, which are already converted
+    for article in api.collection.find({"keywords": {"$type": "string"}}, {"keywords": 1}):
+        if not isinstance(article["keywords"], str):
+            continue
+        converted += 1
+        operations.append(UpdateOne({"_id": article["_id"]}, {"$set": {"keywords": canonicalize([article["keywords"]])}}))
+        if len(operations) >= batch_size:
+            if not dry_run:
+                api.collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations and not dry_run:
+        api.collection.bulk_write(operations, ordered=False)
+    return converted
+
+
+# Function to replace a full-text index that still covers the content, which the articles no
+# longer hold, with the current one
+def rebuild_text_index():
+    try:
+        for index in api.collection.list_indexes():
+            if index.get("weights", {}).get("content") is not None:
+                api.collection.drop_index(index["name"])
+    except errors.PyMongoError as e:
+        print(f"Error dropping the old text index: {e}")
+    api.ensure_indexes()
+
+
+# Migrate from the command line: python -m backend.migrate [--batch-size 500] [--dry-run]
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move article content and embeddings into the compressed body store "
+                                                 "and keywords into keyword arrays")
+    parser.add_argument("--batch-size", type=int, default=500, help="articles migrated per round-trip")
+    parser.add_argument("--dry-run", action="store_true", help="report what would be moved without writing")
+    args = parser.parse_args()
+
+    totals = None
+    for totals in iter_migrate(args.batch_size, args.dry_run):
+        print(f"{'Would move' if args.dry_run else 'Moved'} {totals['articles']} article bodies, "
+              f"{totals['raw_bytes']} bytes of content compressed to {totals['compressed_bytes']}")
+    if totals is None:
+        print("Every article is already in the split layout")
+    elif totals["skipped"]:
+        print(f"{totals['skipped']} articles without a key kept their content inline: another article already has their key")
+    converted = migrate_keywords(args.batch_size, args.dry_run)
+    if converted:
+        print(f"{'Would convert' if args.dry_run else 'Converted'} the keywords of {converted} articles to keyword arrays")
+    if not args.dry_run:
+        rebuild_text_index()
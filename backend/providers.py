@@ -0,0 +1,183 @@
+import copy
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from backend import metrics
+from backend.fanout import time_left
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, float("inf"))
+
+
+# Statuses worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+# HTTP client for one upstream provider. It keeps a connection-pooled session for the
+# life of the process, applies connect/read timeouts, retries idempotent requests on
+# connection errors and 429/5xx responses, and records latency and error metrics.
+# A request and its retries share `budget` seconds (less inside a fan-out call with less
+# time left): waits, including a provider's Retry-After, never run past it.
+# With a ResponseCache, `fetch` serves parsed results for up to `cache_ttl` seconds
+# and then revalidates them with the provider's ETag/Last-Modified validators.
+class ProviderClient:
+    def __init__(self, name, url, connect_timeout=3.05, read_timeout=10, retries=2, backoff=0.5, pool_size=10,
+                 cache=None, cache_ttl=3600, budget=None):
+        self.name = name
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.budget = budget or connect_timeout + read_timeout
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        self.retries = retries
+        self.backoff = backoff
+
+        # Retries are made by `get` itself, so they can be kept within the budget
+        self.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate", "User-Agent": "Journalize"})
+
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.latency_counts = [0] * len(LATENCY_BUCKETS)
+
+    # Function to get the time.perf_counter() deadline of a request starting now
+    def _deadline(self):
+        deadline = time.perf_counter() + self.budget
+        left = time_left()
+        return deadline if left is None else min(deadline, time.perf_counter() + left)
+
+    # Function to pick the wait before retrying the attempt numbered `attempt` (from 0): the
+    # provider's Retry-After or urllib3's backoff schedule (backoff * 2^(attempt - 1), none
+    # before the first retry). Returns None when no retry is left or the wait would run past
+    # the deadline, as nobody would be waiting for the answer by then.
+    def _retry_delay(self, attempt, retry_after, deadline):
+        if attempt >= self.retries:
+            return None
+        delay = self.backoff * 2 ** (attempt - 1) if attempt else 0
+        if retry_after and retry_after.isdigit():
+            delay = int(retry_after)
+        if time.perf_counter() + delay >= deadline:
+            return None
+        return delay
+
+    def get(self, params=None, **kwargs):
+        timeout = kwargs.pop("timeout", self.timeout)
+        deadline = self._deadline()
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            left = max(deadline - time.perf_counter(), 0.001)
+            try:
+                response = self.session.get(self.url, params=params, timeout=(min(timeout[0], left), min(timeout[1], left)),
+                                            **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                delay = self._retry_delay(attempt, None, deadline)
+                if delay is None:
+                    self._record(time.perf_counter() - started, failed=True)
+                    raise
+            except requests.RequestException:
+                self._record(time.perf_counter() - started, failed=True)
+                raise
+            else:
+                delay = None
+                if response.status_code in RETRY_STATUSES:
+                    delay = self._retry_delay(attempt, response.headers.get("Retry-After", ""), deadline)
+                if delay is None:
+                    # Like urllib3's retries, one call counts as one request however many attempts it took
+                    self._record(time.perf_counter() - started, failed=response.status_code >= 400)
+                    return response
+                response.close()
+            metrics.inc("journalize_retries_total", target=self.name)
+            time.sleep(delay)
+            attempt += 1
+
+    # Function to get and parse a response, going through the response cache when there is one.
+    # `parse` turns a response into the result; `query` and `page_size` identify it in the cache.
+    def fetch(self, params, parse, query, page_size):
+        with metrics.span("provider", provider=self.name):
+            return self._fetch(params, parse, query, page_size)
+
+    def _fetch(self, params, parse, query, page_size):
+        if self.cache is None:
+            return self._parse(parse, self.get(params=params))
+
+        key = self.cache.key(self.name, query, page_size)
+        entry, fresh = self.cache.get(key, self.cache_ttl)
+        if fresh:
+            self.cache.count("hits")
+            # Callers update the articles they get back, so never hand out the cached objects
+            return copy.deepcopy(entry["value"])
+
+        response = self.get(params=params, headers=self._validators(entry))
+        return self._store(key, entry, response, parse)
+
+    # Function to build the conditional request headers for a stale cache entry
+    def _validators(self, entry):
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    # Function to turn a provider response into the result, refreshing the cache entry
+    def _store(self, key, entry, response, parse):
+        if response.status_code == 304 and entry:
+            self.cache.count("revalidated")
+            self.cache.set(key, entry["value"], entry.get("etag"), entry.get("last_modified"))
+            return copy.deepcopy(entry["value"])
+
+        self.cache.count("misses")
+        value = self._parse(parse, response)
+        if response.status_code == 200:
+            self.cache.set(key, copy.deepcopy(value), response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return value
+
+    def _parse(self, parse, response):
+        with metrics.span("parse", provider=self.name):
+            return parse(response)
+
+    def _record(self, seconds, failed):
+        with self.lock:
+            self.requests += 1
+            self.errors += failed
+            self.latency_sum += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    self.latency_counts[i] += 1
+                    break
+
+    # Function to count the TCP connections opened and requests sent by this client's pools
+    def _pool_usage(self):
+        connections = 0
+        pool_requests = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                pool_requests += pool.num_requests
+        return connections, pool_requests
+
+    def stats(self):
+        connections, pool_requests = self._pool_usage()
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "error_rate": round(self.errors / self.requests, 3) if self.requests else 0.0,
+                "latency_sum_seconds": round(self.latency_sum, 3),
+                "latency_histogram": {
+                    ("+Inf" if bound == float("inf") else str(bound)): count
+                    for bound, count in zip(LATENCY_BUCKETS, self.latency_counts)
+                },
+                "connections_opened": connections,
+                # Share of requests that went out on an already-open connection
+                "pool_reuse": round(1 - connections / pool_requests, 3) if pool_requests else 0.0,
+            }
@@ -0,0 +1,91 @@
+import os
+import threading
+
+
+# Registry of the long-lived clients a process needs (MongoDB, OpenAI, TextRazor, provider
+# sessions, ...). Each one is built by its factory the first time it is used, so importing
+# the backend has no side effects, and a forked worker starts over with its own clients
+# instead of sharing the parent's sockets and threads.
+class Services:
+    def __init__(self):
+        self.factories = {}
+        self.instances = {}
+        self.overrides = {}
+        self.lock = threading.RLock()
+        self.pid = os.getpid()
+
+    def register(self, name, factory):
+        self.factories[name] = factory
+        self.instances.pop(name, None)
+
+    def get(self, name):
+        if self.pid != os.getpid():
+            self.reset()
+        if name in self.overrides:
+            return self.overrides[name]
+        try:
+            return self.instances[name]
+        except KeyError:
+            pass
+        with self.lock:
+            if name not in self.instances:
+                self.instances[name] = self.factories[name]()
+            return self.instances[name]
+
+    # Function to use a given object for a service, e.g. a mongomock client in tests.
+    # Services built from other services are rebuilt on next use.
+    def override(self, name, instance):
+        self.overrides[name] = instance
+        self.instances = {}
+
+    def clear_overrides(self):
+        self.overrides = {}
+        self.instances = {}
+
+    # Function to drop every client built so far; runs on its own in a forked child
+    def reset(self):
+        self.instances = {}
+        # A lock held by another thread at fork time would never be released in the child
+        self.lock = threading.RLock()
+        self.pid = os.getpid()
+
+    def proxy(self, name):
+        return ServiceProxy(self, name)
+
+
+# Stand-in that resolves a service on every use, so modules can keep a global name such as
+# `collection` for a client that is only created when it is first needed
+class ServiceProxy:
+    __slots__ = ("_services", "_name")
+
+    def __init__(self, services, name):
+        object.__setattr__(self, "_services", services)
+        object.__setattr__(self, "_name", name)
+
+    def _resolve(self):
+        return self._services.get(self._name)
+
+    def __getattr__(self, attribute):
+        return getattr(self._resolve(), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._resolve(), attribute, value)
+
+    def __delattr__(self, attribute):
+        delattr(self._resolve(), attribute)
+
+    def __getitem__(self, key):
+        return self._resolve()[key]
+
+    def __len__(self):
+        return len(self._resolve())
+
+    def __iter__(self):
+        return iter(self._resolve())
+
+    def __repr__(self):
+        return f"<service {self._name}>"
+
+
+# Services shared by the whole backend
+services = Services()
@@ -0,0 +1,59 @@
+import copy
+import threading
+from backend import metrics
+
+
+# Function to normalize a search query or chat prompt so trivially different spellings share a key
+def normalize_query(text):
+    return " ".join(str(text).lower().split())
+
+
+# One computation in progress and the callers waiting for it
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+# Runs each distinct piece of work once at a time. A caller asking for a key that is already
+# being computed waits for that call and gets its result (or exception) instead of repeating
+# it. Nothing is kept once the call finishes; caching results is left to the caches.
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+            else:
+                flight.waiters += 1
+
+        if not leader:
+            metrics.inc("journalize_coalesced_total", flight=self.name)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            # Callers update what they get back, so each waiter gets its own copy
+            return copy.deepcopy(flight.result)
+
+        result = None
+        try:
+            result = func(*args, **kwargs)
+            return result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            # Snapshot the result before the leader's caller can change it
+            if flight.waiters and flight.error is None:
+                flight.result = copy.deepcopy(result)
+            flight.done.set()
@@ -0,0 +1,163 @@
+import os
+import tempfile
+import threading
+import numpy as np
+
+
+# Function to scale vectors to unit length so a dot product is their cosine similarity
+def normalize(vectors):
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# In-memory cosine-similarity index over unit vectors stored in one contiguous NumPy
+# matrix. A query is a single matrix-vector product, which stays fast into the
+# hundreds of thousands of vectors (see benchmarks/bench_vectors.py).
+class VectorIndex:
+    def __init__(self, dim=0):
+        self.dim = dim
+        self.ids = []
+        self.positions = {}
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.size = 0
+        # Bumped by every add, so a saver can tell whether there is anything new to write
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, vector_id):
+        return vector_id in self.positions
+
+    def add(self, ids, vectors):
+        if not len(ids):
+            return
+        vectors = normalize(vectors)
+        if len(ids) != len(vectors):
+            raise ValueError("ids and vectors must have the same length")
+        with self.lock:
+            if not self.dim:
+                self.dim = vectors.shape[1]
+                self.matrix = np.zeros((0, self.dim), dtype=np.float32)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            for vector_id, vector in zip(ids, vectors):
+                if vector_id in self.positions:
+                    # Re-adding an id replaces its vector
+                    self.matrix[self.positions[vector_id]] = vector
+                    continue
+                if self.size == len(self.matrix):
+                    # Grow geometrically so incremental adds stay amortized O(1)
+                    grown = np.zeros((max(16, 2 * len(self.matrix)), self.dim), dtype=np.float32)
+                    grown[:self.size] = self.matrix[:self.size]
+                    self.matrix = grown
+                self.matrix[self.size] = vector
+                self.positions[vector_id] = self.size
+                self.ids.append(vector_id)
+                self.size += 1
+            self.version += 1
+
+    def query(self, vector, k=5):
+        with self.lock:
+            if not self.size:
+                return []
+            scores = self.matrix[:self.size] @ normalize(vector)[0]
+            k = min(k, self.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self.ids[i], float(scores[i])) for i in top]
+
+    # Function to write a snapshot of the index to `path`; returns the version saved. Only
+    # the copy is made under the lock, so queries and adds aren't held up by the write.
+    def save(self, path):
+        with self.lock:
+            ids = np.array(self.ids, dtype=str)
+            vectors = self.matrix[:self.size].copy()
+            version = self.version
+        # Write to a temporary file of our own first, so a crash never leaves a half-written
+        # index and processes saving at the same time don't write over each other's file
+        directory, name = os.path.split(os.path.abspath(path))
+        descriptor, temporary = tempfile.mkstemp(prefix=f"{name}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(descriptor, "wb") as f:
+                np.savez(f, ids=ids, vectors=vectors)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        return version
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            vectors = data["vectors"]
+            index = cls(dim=vectors.shape[1])
+            index.add(list(data["ids"]), vectors)
+        return index
+
+
+# Background thread that writes an index to `path` every `interval` seconds when it has
+# changed since the last write, and once more when stopped. `before_save` is called with
+# the index first, e.g. to pull in vectors other processes have stored.
+class IndexSaver:
+    def __init__(self, index, path, interval=60.0, before_save=None):
+        self.index = index
+        self.path = path
+        self.interval = interval
+        self.before_save = before_save
+        self.saved_version = index.version
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread:
+            return
+        self.thread = threading.Thread(target=self._run, name="vector-index-saver", daemon=True)
+        self.thread.start()
+
+    # Function to stop the thread and write any vectors added since the last save
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self._save()
+
+    def save_if_changed(self):
+        if self.before_save:
+            self.before_save(self.index)
+        if self.index.version != self.saved_version:
+            self.saved_version = self.index.save(self.path)
+
+    def _save(self):
+        try:
+            self.save_if_changed()
+        except OSError as e:
+            print(f"Error saving vector index: {e}")
+
+    def _run(self):
+        while True:
+            self._save()
+            if self.stopping.wait(self.interval):
+                return
+
+
+# Function to group near-duplicate vectors. Returns, for every vector, the position of
+# the first earlier vector it duplicates (cosine similarity >= threshold), or None.
+def find_duplicates(vectors, threshold):
+    vectors = normalize(vectors)
+    canonical = [None] * len(vectors)
+    kept = []
+    for i, vector in enumerate(vectors):
+        if kept:
+            scores = vectors[kept] @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                canonical[i] = kept[best]
+                continue
+        kept.append(i)
+    return canonical
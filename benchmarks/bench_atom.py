@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+import feedparser
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.atom import iter_arxiv_entries
+
+ENTRY = """  <entry>
+    <id>http://arxiv.org/abs/2401.{number:05d}v1</id>
+    <updated>2024-01-01T00:00:00Z</updated>
+    <published>2024-01-01T00:00:00Z</published>
+    <title>Synthetic paper {number} on graph neural networks
+  for molecular property prediction</title>
+    <summary>{abstract}</summary>
+    <author><name>First Author</name></author>
+    <author><name>Second Author</name></author>
+    <arxiv:comment xmlns:arxiv="http://arxiv.org/schemas/atom">12 pages, 4 figures</arxiv:comment>
+    <link href="http://arxiv.org/abs/2401.{number:05d}v1" rel="alternate" type="text/html"/>
+    <link title="pdf" href="http://arxiv.org/pdf/2401.{number:05d}v1" rel="related" type="application/pdf"/>
+    <arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+    <category term="cs.LG" scheme="http://arxiv.org/schemas/atom"/>
+  </entry>
+"""
+
+# A typical arXiv abstract is around 1,200 characters
+ABSTRACT = ("We propose a method for learning representations of molecules that improves property "
+            "prediction on standard benchmarks while using fewer parameters. ") * 8
+
+
+# Function to build an arXiv-shaped Atom feed with `entries` results
+def make_feed(entries):
+    body = "".join(ENTRY.format(number=i, abstract=ABSTRACT) for i in range(entries))
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<feed xmlns="http://www.w3.org/2005/Atom">\n'
+            '  <title type="html">ArXiv Query</title>\n'
+            f'{body}</feed>\n').encode()
+
+
+def parse_with_feedparser(feed, chunk_size):
+    return [
+        {"source": "Cornell Arxiv", "url": entry.get('id', ''), "title": entry.get('title', 'No title available'),
+         "content": entry.get('summary', 'No summary available')}
+        for entry in feedparser.parse(feed).entries
+    ]
+
+
+def parse_streaming(feed, chunk_size):
+    chunks = (feed[i:i + chunk_size] for i in range(0, len(feed), chunk_size))
+    return list(iter_arxiv_entries(chunks))
+
+
+# Function to time one parser over `pages` feeds and record its peak traced memory
+def measure(parse, feeds, chunk_size):
+    started = time.perf_counter()
+    for feed in feeds:
+        parse(feed, chunk_size)
+    seconds = time.perf_counter() - started
+
+    tracemalloc.start()
+    parse(feeds[0], chunk_size)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def bench(entries, pages, chunk_size):
+    feeds = [make_feed(entries) for _ in range(pages)]
+    if parse_with_feedparser(feeds[0], chunk_size) != parse_streaming(feeds[0], chunk_size):
+        raise SystemExit(f"Parsers disagree on a {entries}-entry feed")
+
+    result = {"entries_per_page": entries, "pages": pages, "page_bytes": len(feeds[0])}
+    for name, parse in (("feedparser", parse_with_feedparser), ("streaming", parse_streaming)):
+        seconds, peak = measure(parse, feeds, chunk_size)
+        result[f"{name}_entries_per_second"] = round(entries * pages / seconds)
+        result[f"{name}_peak_mb"] = round(peak / 2 ** 20, 2)
+    result["speedup"] = round(result["streaming_entries_per_second"] / result["feedparser_entries_per_second"], 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the streaming arXiv parser with feedparser")
+    parser.add_argument("--sizes", default="100,500,1000", help="comma-separated entries per page")
+    parser.add_argument("--pages", type=int, default=5, help="pages parsed per size")
+    parser.add_argument("--chunk-size", type=int, default=65536, help="bytes fed to the streaming parser at a time")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    results = [bench(int(size), args.pages, args.chunk_size) for size in args.sizes.split(",")]
+
+    print(f"{'entries':>8} {'feedparser/s':>13} {'streaming/s':>12} {'speedup':>8} {'fp MB':>8} {'stream MB':>10}")
+    for result in results:
+        print(f"{result['entries_per_page']:>8} {result['feedparser_entries_per_second']:>13} "
+              f"{result['streaming_entries_per_second']:>12} {result['speedup']:>8} "
+              f"{result['feedparser_peak_mb']:>8} {result['streaming_peak_mb']:>10}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# A typical abstract is around 1,200 characters
+ABSTRACT = "We study {query} and report improvements over strong baselines on standard benchmarks. " * 14
+
+
+# Local stand-in for the three providers and the OpenAI API. Latency, payload size and the
+# share of OpenAI requests answered with a 429 are set on the class before serving.
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    provider_latency = 0.2
+    llm_latency = 0.5
+    rate_limit_ratio = 0.0
+    results = 2
+    counts = {"provider": 0, "llm": 0, "rate_limited": 0}
+    lock = threading.Lock()
+
+    @classmethod
+    def count(cls, name):
+        with cls.lock:
+            cls.counts[name] += 1
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        StubHandler.count("provider")
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+        time.sleep(StubHandler.provider_latency)
+        if url.path == "/arxiv":
+            self._send(200, self._atom(params.get("search_query", "")), "application/atom+xml")
+        elif url.path == "/europepmc":
+            self._send(200, json.dumps({"resultList": {"result": [
+                {"id": f"{params.get('query')}-{i}", "doi": f"10.1/{params.get('query')}-{i}",
+                 "title": f"Europe PMC paper {i} on {params.get('query')}",
+                 "abstractText": ABSTRACT.format(query=params.get("query"))}
+                for i in range(StubHandler.results)
+            ]}}).encode(), "application/json")
+        elif url.path == "/ieee":
+            self._send(200, json.dumps({"articles": [
+                {"title": f"IEEE paper {i} on {params.get('querytext')}",
+                 "abstract": ABSTRACT.format(query=params.get("querytext"))}
+                for i in range(StubHandler.results)
+            ]}).encode(), "application/json")
+        else:
+            self._send(404, b"{}", "application/json")
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        StubHandler.count("llm")
+        if random.random() < StubHandler.rate_limit_ratio:
+            StubHandler.count("rate_limited")
+            self._send(429, json.dumps({"error": {"message": "Rate limit reached", "type": "requests"}}).encode(),
+                       "application/json")
+            return
+        time.sleep(StubHandler.llm_latency)
+        if "only replies with JSON" in body["messages"][0]["content"]:
+            content = json.dumps({"summary": "A short benchmark summary.", "topics": ["Benchmarks", "Latency"]})
+        else:
+            content = "A short benchmark answer."
+        self._send(200, json.dumps({
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        }).encode(), "application/json")
+
+    def _atom(self, query):
+        entries = "".join(
+            f"<entry><id>http://arxiv.org/abs/{abs(hash(query)) % 10 ** 8}.{i}v1</id>"
+            f"<title>arXiv paper {i} on {query}</title><summary>{ABSTRACT.format(query=query)}</summary></entry>"
+            for i in range(StubHandler.results)
+        )
+        return f'<feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'.encode()
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+# Function to point the app at the stubs; must run before backend.api is imported
+def configure(stub_url, args, job_db):
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_API_BASE": f"{stub_url}/v1",
+        "ARXIV_URL": f"{stub_url}/arxiv",
+        "EUROPEPMC_URL": f"{stub_url}/europepmc",
+        "IEEE_URL": f"{stub_url}/ieee",
+        "IEEE_API_KEY": "bench",
+        "RESULTS_PER_PROVIDER": str(args.results),
+        "RESPONSE_CACHE": args.response_cache,
+        "ENRICHMENT_MODE": args.enrichment_mode,
+        "JOB_DB_PATH": job_db,
+        "JOB_WORKERS": "0",
+    })
+    if args.mongodb_uri:
+        os.environ["MONGODB_URI"] = args.mongodb_uri
+    else:
+        # mongomock storage and local keywords; the chat client is swapped for a real one below
+        os.environ["OFFLINE"] = "1"
+
+
+# Function to read this process's current resident memory in MB; None where /proc is missing
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * resource.getpagesize() / 2 ** 20, 1)
+    except OSError:
+        return None
+
+
+# Resident memory while a scenario runs, sampled from a background thread: ru_maxrss only
+# keeps the process-wide high-water mark, which later scenarios would inherit
+class RssSampler:
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None:
+            self.peak_mb = max(self.peak_mb or 0, rss)
+        return rss
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopping.set()
+        self.thread.join()
+        self.end_mb = self._sample()
+
+    def result(self):
+        return {"rss_start_mb": self.start_mb, "rss_peak_mb": self.peak_mb, "rss_end_mb": self.end_mb}
+
+
+# Function to send `requests` requests from `concurrency` threads and summarize their latencies
+def drive(base_url, scenario, requests, concurrency, distinct):
+    import requests as http
+    local = threading.local()
+
+    def one(i):
+        if not hasattr(local, "session"):
+            local.session = http.Session()
+        topic = i % distinct
+        started = time.perf_counter()
+        try:
+            if scenario == "search":
+                response = local.session.post(f"{base_url}/search", data={"query": f"graph networks topic{topic}"})
+            elif scenario == "chat":
+                response = local.session.post(f"{base_url}/chat", json={"message": f"What is new in topic {topic}?"})
+            else:
+                response = local.session.get(f"{base_url}/database")
+            ok = response.status_code < 400
+        except http.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with RssSampler() as rss, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies = [seconds * 1000 for seconds, ok in outcomes]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": sum(not ok for seconds, ok in outcomes),
+        "throughput_rps": round(requests / wall, 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 1),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 1),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 1),
+        # Resident memory of the whole benchmark process (app, stubs and load driver) before,
+        # at its sampled peak during and after this scenario
+        **rss.result(),
+    }
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test /search, /chat and /database against local stand-ins")
+    parser.add_argument("--scenarios", default="search,chat,database", help="comma-separated scenarios to run")
+    parser.add_argument("--requests", type=int, default=50, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--distinct", type=int, help="distinct queries to cycle through (default: all unique)")
+    parser.add_argument("--provider-latency", type=float, default=0.2, help="seconds each stub provider waits")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds the fake OpenAI endpoint waits")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="share of OpenAI requests answered with 429")
+    parser.add_argument("--results", type=int, default=2, help="articles each provider returns")
+    parser.add_argument("--enrichment-mode", default="separate", choices=["separate", "combined", "batch"])
+    parser.add_argument("--response-cache", default="off", choices=["memory", "off"])
+    parser.add_argument("--mongodb-uri", help="use this MongoDB instead of mongomock")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    StubHandler.provider_latency = args.provider_latency
+    StubHandler.llm_latency = args.llm_latency
+    StubHandler.rate_limit_ratio = args.rate_limit_ratio
+    StubHandler.results = args.results
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    stub.daemon_threads = True
+    stub_url = serve(stub)
+
+    job_dir = tempfile.TemporaryDirectory()
+    configure(stub_url, args, os.path.join(job_dir.name, "jobs.db"))
+
+    from werkzeug.serving import make_server
+    from backend import api
+    from backend.llm import ChatClient
+    from front.app import app
+
+    # Talk to the fake OpenAI endpoint over HTTP even when storage is offline
+    api.services.override("llm", ChatClient(
+        api_key="bench", model="gpt-3.5-turbo", concurrency=api.LLM_CONCURRENCY, max_retries=5
+    ))
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    app_url = serve(server)
+
+    results = {}
+    for scenario in args.scenarios.split(","):
+        before = dict(StubHandler.counts)
+        results[scenario] = drive(app_url, scenario, args.requests, args.concurrency, args.distinct or args.requests)
+        # Upstream traffic the scenario caused, e.g. to check caches or retries
+        results[scenario]["upstream"] = {name: StubHandler.counts[name] - before[name] for name in before}
+
+    # High-water mark of the whole run, reported once as no scenario owns it
+    peak_rss_mb = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    print(f"{'scenario':>10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} "
+          f"{'rss MB':>8} {'peak MB':>8}")
+    for scenario, result in results.items():
+        print(f"{scenario:>10} {result['throughput_rps']:>8} {result['p50_ms']:>8} {result['p95_ms']:>8} "
+              f"{result['p99_ms']:>8} {result['errors']:>7} {str(result['rss_end_mb']):>8} {str(result['rss_peak_mb']):>8}")
+    print(f"process peak RSS: {peak_rss_mb} MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "commit": current_commit(),
+                "config": vars(args),
+                "process_peak_rss_mb": peak_rss_mb,
+                "results": results,
+            }, f, indent=2)
+
+    server.shutdown()
+    stub.shutdown()
+    job_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
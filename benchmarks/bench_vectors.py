@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.vectors import VectorIndex
+
+
+# Function to time incremental adds and top-k queries against an index of `size` random vectors
+def bench(size, dim, queries, k, rng):
+    vectors = rng.standard_normal((size, dim), dtype=np.float32)
+    index = VectorIndex()
+
+    started = time.perf_counter()
+    # Add in search-sized batches, the way the pipeline grows the index
+    for start in range(0, size, 100):
+        index.add([str(i) for i in range(start, min(start + 100, size))], vectors[start:start + 100])
+    add_seconds = time.perf_counter() - started
+
+    latencies = []
+    for vector in rng.standard_normal((queries, dim), dtype=np.float32):
+        started = time.perf_counter()
+        index.query(vector, k=k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "size": size,
+        "dim": dim,
+        "adds_per_second": round(size / add_seconds),
+        "query_p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "query_p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "query_p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark VectorIndex query latency against corpus size")
+    parser.add_argument("--sizes", default="1000,10000,50000,100000", help="comma-separated corpus sizes")
+    parser.add_argument("--dim", type=int, default=1536, help="embedding dimension (1536 for text-embedding-ada-002)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = [bench(int(size), args.dim, args.queries, args.k, rng) for size in args.sizes.split(",")]
+
+    print(f"{'size':>8} {'adds/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for result in results:
+        print(f"{result['size']:>8} {result['adds_per_second']:>10} {result['query_p50_ms']:>8} "
+              f"{result['query_p95_ms']:>8} {result['query_p99_ms']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,17 @@
 import sys
 import os
-from flask import Flask, render_template, flash, redirect, url_for, request, jsonify
+import json
+import time
+from flask import Flask, render_template, flash, redirect, url_for, request, jsonify, Response, stream_with_context, g
 from flask_login import LoginManager, current_user, login_user, logout_user, login_required
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from backend.api import get_articles, retrieve_all, format_results, gpt_output
+from backend.api import (
+    get_articles, get_article_content, search_local, similar_articles, retrieve_all, iter_retrieve_all,
+    format_results, gpt_output, iter_gpt_output, enrichment_cache, response_cache, ensure_indexes, provider_stats,
+    job_queue, JOB_HANDLERS, keyword_extractor
+)
+from backend.jobs import WorkerPool
+from backend import metrics
 from front.forms import RegistrationForm, LoginForm
 from front.models import User
 from front.db import db
@@ -11,12 +19,41 @@ from front.db import db
 app = Flask(__name__, static_folder='styles')
 app.config['SECRET_KEY'] = os.urandom(24)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
+# Render search results as they arrive over Server-Sent Events instead of waiting for the whole pipeline
+app.config['STREAM_SEARCH'] = os.getenv('STREAM_SEARCH', '0') == '1'
+# Show chat replies token by token from /chat/stream instead of waiting for the whole answer
+app.config['STREAM_CHAT'] = os.getenv('STREAM_CHAT', '0') == '1'
 
 # Initialize SQLAlchemy
 db.init_app(app)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
+# Worker threads for background searches. Set JOB_WORKERS=0 to leave the
+# work to separate `python -m backend.jobs` processes instead.
+job_workers = WorkerPool(job_queue, JOB_HANDLERS, workers=int(os.getenv('JOB_WORKERS', 2)))
+
+# Work that needs the database or threads waits for the first request, in the process
+# that serves it, so importing the app stays cheap and safe to fork into workers
+@app.before_first_request
+def start_services():
+    ensure_indexes()  # Create the MongoDB indexes the article queries rely on
+    job_workers.start()
+
+# Time every request by endpoint; streamed responses are timed up to their first byte
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    if 'request_started' in g:
+        endpoint = request.endpoint or "unmatched"
+        metrics.registry.observe("journalize_request_seconds", time.perf_counter() - g.request_started, endpoint=endpoint)
+        if response.status_code >= 500:
+            metrics.error("request", endpoint=endpoint)
+    return response
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -71,11 +108,44 @@ def logout():
 def search():
     if request.method == 'POST':
         query = request.form['query']  # Get the search query from the form
-        raw_results = retrieve_all(query)  # Get raw results from API
+        if request.form.get('background') or request.args.get('background'):
+            # Queue the search and let the client poll for the result
+            job_id = job_queue.enqueue("search", {"query": query})
+            job_workers.notify()
+            return jsonify({"job_id": job_id, "status_url": url_for('job_status', job_id=job_id)}), 202
+        if app.config['STREAM_SEARCH']:
+            # The page fills itself in from /search/stream
+            return render_template('search_results.html', query=query, results=[], stream=True)
+        keywords = keyword_extractor.query(query)  # Turn the question into canonical keywords
+        raw_results = retrieve_all(keywords)  # Get raw results from API
         results = format_results(raw_results)  # Format the results
         return render_template('search_results.html', query=query, results=results)
     return render_template('search.html')  # Render the search page template
 
+# Route streaming search results as Server-Sent Events
+@app.route('/search/stream')
+def search_stream():
+    keywords = keyword_extractor.query(request.args.get('query', ''))
+
+    def events():
+        for event, index, data in iter_retrieve_all(keywords):
+            if event == "done":
+                payload = {"timings": data}
+            else:
+                payload = dict(format_results([data])[0], index=index)
+            yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Route reporting a background search's status, progress and result
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
 @app.route('/chat', methods=['POST'])
 def chat():
     data = request.get_json()  # Get the JSON data from the request
@@ -83,11 +153,82 @@ def chat():
     bot_response = gpt_output(user_message)  # Get the chatbot's response
     return jsonify({"response": bot_response})  # Return the response as JSON
 
+# Route streaming the chatbot's reply as Server-Sent Events, one event per token
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    user_message = (request.get_json() or {}).get('message', '')
+
+    def events():
+        try:
+            for token in iter_gpt_output(user_message):
+                yield f"event: token\ndata: {json.dumps(token)}\n\n"
+        except Exception as e:
+            metrics.error("chat", mode="stream")
+            print(e)
+            yield f"event: error\ndata: {json.dumps('ChatBot failed')}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/stats')
+def stats():
+    return jsonify({
+        "enrichment_cache": enrichment_cache.stats(),  # Cache hit/miss counters
+        "providers": provider_stats(),  # Latency, errors and connection reuse per provider
+        "response_cache": response_cache.stats() if response_cache else None  # Provider response hit ratio
+    })
+
+
+# Route exposing the pipeline metrics in the Prometheus text format
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 
 @app.route('/database')
 def database():
-    articles = get_articles()
-    return render_template('database.html', articles=articles, enumerate=enumerate)
+    source = request.args.get('source', '')
+    keyword = request.args.get('keyword', '')
+    page = {
+        "limit": max(1, min(request.args.get('limit', 20, type=int), 100)),
+        "before": request.args.get('before'),
+        "source": source,
+        "keyword": keyword
+    }
+    articles, next_cursor = get_articles(**page)
+    return render_template('database.html', articles=articles, next_cursor=next_cursor,
+                           source=source, keyword=keyword, enumerate=enumerate)
+
+# Route for ranked full-text search over stored articles, returned as JSON
+@app.route('/articles/search')
+def articles_search():
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    articles = search_local(query, limit)
+    results = format_results(articles)
+    for article, result in zip(articles, results):
+        result.update({"id": str(article['_id']), "score": article.get('score', 0)})
+    return jsonify({"query": query, "results": results})
+
+# Route returning the stored articles most similar to a given one, as JSON
+@app.route('/articles/<article_id>/similar')
+def articles_similar(article_id):
+    articles = similar_articles(article_id, k=max(1, min(request.args.get('k', 5, type=int), 50)))
+    results = format_results(articles)
+    for article, result in zip(articles, results):
+        result.update({"id": str(article['_id']), "score": article['score']})
+    return jsonify({"results": results})
+
+# Route returning an article's full content for the history page
+@app.route('/database/<article_id>/content')
+def database_content(article_id):
+    content = get_article_content(article_id)
+    if content is None:
+        return jsonify({"error": "Article not found"}), 404
+    return jsonify({"content": content})
 
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0")
@@ -0,0 +1,18 @@
+import sys
+import os
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from front.app import app
+
+
+# asgiref runs every WSGI request in one shared thread unless it is given a context of
+# its own, which would serve requests one at a time; give each request its own thread
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        async with ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+
+# ASGI entry point, e.g. `uvicorn front.asgi:asgi_app`
+asgi_app = ThreadedWsgiToAsgi(app)
@@ -11,6 +11,8 @@ os.environ['OPENAI_API_KEY'] = 'test_openai_api_key'
 os.environ['IEEE_API_KEY'] = 'test_ieee_api_key'
 os.environ['TEXTRAZOR_API_KEY'] = 'test_textrazor_api_key'
 os.environ['MONGODB_URI'] = 'test_mongodb_uri'
+# run against mongomock and the offline chat client
+os.environ['OFFLINE'] = '1'
 
 # import functions to be tested from backend.api
 from backend.api import (
@@ -20,13 +22,28 @@ from backend.api import (
     summarize_with_openai,
     extract_topics_with_openai,
     insert_to_mongodb,
-    process_article
+    enrich_article,
+    parse_enrichment_json,
+    plan_batches,
+    enrich_articles,
+    iter_retrieve_all,
+    article_key,
+    save_articles,
+    get_articles,
+    articles_query,
+    collection,
+    retrieve_all,
+    pack_context,
+    gpt_output
 )
+from backend.services import services
+from bson import ObjectId
+import mongomock
 
 class TestApi(unittest.TestCase):
 
-    # mock the requests.get function used in retrieve_cornell
-    @patch('backend.api.requests.get')
+    # mock the provider client used in retrieve_cornell
+    @patch('backend.api.arxiv_client.get')
     def test_retrieve_cornell(self, mock_get):
         # setup the mock response
         mock_response = MagicMock()
@@ -34,18 +51,16 @@ class TestApi(unittest.TestCase):
         mock_response.content = '<feed><entry><id>test_id</id><title>Test Title</title><summary>Test Summary</summary></entry></feed>'
         mock_get.return_value = mock_response
 
-        # mock the process_article function
-        with patch('backend.api.process_article') as mock_process_article:
-            retrieve_cornell(2, 'test_keywords')
-            mock_process_article.assert_called_once()  # ensure process_article is called once
-            article_data = mock_process_article.call_args[0][0]  # get the argument passed to process_article
-            self.assertEqual(article_data['source'], 'Cornell Arxiv')  # check the source of the article
-            self.assertEqual(article_data['title'], 'Test Title')  # check the title of the article
-            self.assertEqual(article_data['content'], 'Test Summary')  # check the content of the article
-            print("Test `test_retrieve_cornell`: PASSED")
-
-    # mock the requests.get function used in retrieve_euro
-    @patch('backend.api.requests.get')
+        articles = retrieve_cornell(2, 'test_keywords')
+        self.assertEqual(len(articles), 1)  # ensure the one entry is parsed into an article
+        article_data = articles[0]
+        self.assertEqual(article_data['source'], 'Cornell Arxiv')  # check the source of the article
+        self.assertEqual(article_data['title'], 'Test Title')  # check the title of the article
+        self.assertEqual(article_data['content'], 'Test Summary')  # check the content of the article
+        print("Test `test_retrieve_cornell`: PASSED")
+
+    # mock the provider client used in retrieve_euro
+    @patch('backend.api.euro_client.get')
     def test_retrieve_euro(self, mock_get):
         # setup the mock response
         mock_response = MagicMock()
@@ -66,18 +81,16 @@ class TestApi(unittest.TestCase):
         }
         mock_get.return_value = mock_response
 
-        # mock the process_article function
-        with patch('backend.api.process_article') as mock_process_article:
-            retrieve_euro(2, 'test_keywords')
-            mock_process_article.assert_called_once()  # ensure process_article is called once
-            article_data = mock_process_article.call_args[0][0]  # get the argument passed to process_article
-            self.assertEqual(article_data['source'], 'Europe PMC')  # check the source of the article
-            self.assertEqual(article_data['title'], 'Test Title')  # check the title of the article
-            self.assertEqual(article_data['content'], 'Test Abstract')  # check the content of the article
-            print("Test `test_retrieve_euro`: PASSED")
-
-    # mock the requests.get function used in retrieve_ieee
-    @patch('backend.api.requests.get')
+        articles = retrieve_euro(2, 'test_keywords')
+        self.assertEqual(len(articles), 1)  # ensure the one entry is parsed into an article
+        article_data = articles[0]
+        self.assertEqual(article_data['source'], 'Europe PMC')  # check the source of the article
+        self.assertEqual(article_data['title'], 'Test Title')  # check the title of the article
+        self.assertEqual(article_data['content'], 'Test Abstract')  # check the content of the article
+        print("Test `test_retrieve_euro`: PASSED")
+
+    # mock the provider client used in retrieve_ieee
+    @patch('backend.api.ieee_client.get')
     def test_retrieve_ieee(self, mock_get):
         # setup the mock response
         mock_response = MagicMock()
@@ -92,38 +105,37 @@ class TestApi(unittest.TestCase):
         }
         mock_get.return_value = mock_response
 
-        # mock the process_article function
-        with patch('backend.api.process_article') as mock_process_article:
-            retrieve_ieee(2, 'test_keywords')
-            mock_process_article.assert_called_once()  # ensure process_article is called once
-            article_data = mock_process_article.call_args[0][0]  # get the argument passed to process_article
-            self.assertEqual(article_data['source'], 'IEEE Xplore')  # check the source of the article
-            self.assertEqual(article_data['title'], 'Test Title')  # check the title of the article
-            self.assertEqual(article_data['content'], 'Test Abstract')  # check the content of the article
-            print("Test `test_retrieve_ieee`: PASSED")
-
-    # mock the openai.ChatCompletion.create function used in summarize_with_openai
-    @patch('backend.api.openai.ChatCompletion.create')
-    def test_summarize_with_openai(self, mock_openai_create):
+        articles = retrieve_ieee(2, 'test_keywords')
+        self.assertEqual(len(articles), 1)  # ensure the one entry is parsed into an article
+        article_data = articles[0]
+        self.assertEqual(article_data['source'], 'IEEE Xplore')  # check the source of the article
+        self.assertEqual(article_data['title'], 'Test Title')  # check the title of the article
+        self.assertEqual(article_data['content'], 'Test Abstract')  # check the content of the article
+        print("Test `test_retrieve_ieee`: PASSED")
+
+    # mock the chat client and the cache used in summarize_with_openai
+    @patch('backend.api.enrichment_cache')
+    @patch('backend.api.llm')
+    def test_summarize_with_openai(self, mock_llm, mock_cache):
         # setup the mock response
-        mock_response = MagicMock()
-        mock_response.choices = [MagicMock(message={'content': 'Test Summary'})]
-        mock_openai_create.return_value = mock_response
+        mock_cache.get.return_value = None
+        mock_llm.create.return_value = MagicMock(choices=[MagicMock(message=MagicMock(content=' Test Summary '))])
 
         summary = summarize_with_openai("Test content")
         self.assertEqual(summary, 'Test Summary')  # check the summary returned
+        mock_cache.set.assert_called_once_with(mock_cache.key.return_value, 'Test Summary')  # check the summary is cached
         print("Test `test_summarize_with_openai`: PASSED")
 
-    # mock the openai.ChatCompletion.create function used in extract_topics_with_openai
-    @patch('backend.api.openai.ChatCompletion.create')
-    def test_extract_topics_with_openai(self, mock_openai_create):
+    # mock the chat client and the cache used in extract_topics_with_openai
+    @patch('backend.api.enrichment_cache')
+    @patch('backend.api.llm')
+    def test_extract_topics_with_openai(self, mock_llm, mock_cache):
         # setup the mock response
-        mock_response = MagicMock()
-        mock_response.choices = [MagicMock(message={'content': 'Topic1, Topic2'})]
-        mock_openai_create.return_value = mock_response
+        mock_cache.get.return_value = None
+        mock_llm.create.return_value = MagicMock(choices=[MagicMock(message=MagicMock(content='Topic1\nTopic2'))])
 
         topics = extract_topics_with_openai("Test text")
-        self.assertEqual(topics, {"topic_1": "Topic1", "topic_2": "Topic2"})  # check the topics returned
+        self.assertEqual(topics, {"topics": ["Topic1", "Topic2"]})  # check the topics returned
         print("Test `test_extract_topics_with_openai`: PASSED")
 
     # mock the MongoDB collection object
@@ -134,43 +146,287 @@ class TestApi(unittest.TestCase):
             "title": "Test Title",
             "content": "Test Content"
         }
-        insert_to_mongodb(article_data)
-        mock_collection.insert_one.assert_called_once_with(article_data)  # ensure insert_one is called once with correct data
+        insert_to_mongodb(article_data, "test_keywords")
+        mock_collection.bulk_write.assert_called_once()  # ensure the article is written with one bulk call
+        operations = mock_collection.bulk_write.call_args[0][0]
+        self.assertEqual(len(operations), 1)
+        self.assertEqual(operations[0]._filter, {"key": article_key(article_data)})  # ensure the article is upserted by its key
+        self.assertEqual(operations[0]._doc["$addToSet"]["keywords"], {"$each": ["test_keywords"]})  # ensure the search keywords are passed in, not read from a global
         print("Test `test_insert_to_mongodb`: PASSED")
 
-    # mock the insert_to_mongodb function used in process_article
-    @patch('backend.api.insert_to_mongodb')
-    def test_process_article_with_no_content(self, mock_insert_to_mongodb):
+    def test_article_key(self):
+        self.assertEqual(article_key({"url": "http://arxiv.org/abs/2101.00001v2"}), "arxiv:2101.00001")  # check the arXiv version is dropped
+        self.assertEqual(article_key({"doi": "https://doi.org/10.1000/TEST"}), "doi:10.1000/test")  # check DOIs are normalized
+        self.assertEqual(article_key({"doi": "NAN", "title": "Deep  Learning!"}), article_key({"title": "deep learning"}))  # check titles are normalized
+        print("Test `test_article_key`: PASSED")
+
+    # duplicates within one search should collapse into a single upsert
+    @patch('backend.api.collection')
+    def test_save_articles_deduplicates(self, mock_collection):
+        articles = [
+            {"source": "Cornell Arxiv", "url": "http://arxiv.org/abs/2101.00001v1", "title": "A"},
+            {"source": "Cornell Arxiv", "url": "http://arxiv.org/abs/2101.00001v2", "title": "A"},
+            {"source": "Europe PMC", "doi": "10.1000/test", "title": "B"}
+        ]
+        save_articles(articles, "test_keywords")
+        operations = mock_collection.bulk_write.call_args[0][0]
+        self.assertEqual(len(operations), 2)  # check the two arXiv versions were merged
+        self.assertFalse(mock_collection.bulk_write.call_args.kwargs["ordered"])  # check the bulk write is unordered
+        self.assertNotIn("_id", articles[0])  # check the caller's dicts are left untouched
+        print("Test `test_save_articles_deduplicates`: PASSED")
+
+    # mock the chat client, which should not be called for an article without content
+    @patch('backend.api.llm')
+    def test_enrich_article_with_no_content(self, mock_llm):
         article_data = {
             "source": "Test Source",
             "title": "Test Title",
             "content": "No summary available"
         }
-        process_article(article_data)
+        enrich_article(article_data)
         self.assertEqual(article_data['summary'], "As there's no available content provided, a summary cannot be created.")  # check the summary
-        self.assertIn("topic_1", article_data['topics'])  # check the topics
-        self.assertIn("topic_2", article_data['topics'])
-        mock_insert_to_mongodb.assert_called_once_with(article_data)  # ensure insert_to_mongodb is called once with correct data
-        print("Test `test_process_article_with_no_content`: PASSED")
+        self.assertEqual(article_data['topics'], ["Lack of available content", "Inability to create a summary"])  # check the topics
+        mock_llm.create.assert_not_called()  # ensure no completion was requested
+        print("Test `test_enrich_article_with_no_content`: PASSED")
 
-    # mock the summarize_with_openai, extract_topics_with_openai, and insert_to_mongodb functions used in process_article
+    # mock the summarize_with_openai and extract_topics_with_openai functions used in enrich_article
+    @patch('backend.api.ENRICHMENT_MODE', 'separate')
     @patch('backend.api.summarize_with_openai')
     @patch('backend.api.extract_topics_with_openai')
-    @patch('backend.api.insert_to_mongodb')
-    def test_process_article_with_content(self, mock_insert_to_mongodb, mock_extract_topics, mock_summarize):
+    def test_enrich_article_with_content(self, mock_extract_topics, mock_summarize):
         mock_summarize.return_value = "Test Summary"
-        mock_extract_topics.return_value = {"topic_1": "Topic1", "topic_2": "Topic2"}
+        mock_extract_topics.return_value = {"topics": ["Topic1", "Topic2"]}
 
         article_data = {
             "source": "Test Source",
             "title": "Test Title",
             "content": "This is a test content."
         }
-        process_article(article_data)
+        enrich_article(article_data)
         self.assertEqual(article_data['summary'], "Test Summary")  # check the summary
-        self.assertEqual(article_data['topics'], {"topic_1": "Topic1", "topic_2": "Topic2"})  # check the topics
-        mock_insert_to_mongodb.assert_called_once_with(article_data)  # ensure insert_to_mongodb is called once with correct data
-        print("Test `test_process_article_with_content`: PASSED")
+        self.assertEqual(article_data['topics'], ["Topic1", "Topic2"])  # check the topics
+        mock_extract_topics.assert_called_once_with("Test Summary")  # ensure the topics are extracted from the summary
+        print("Test `test_enrich_article_with_content`: PASSED")
+
+    def test_parse_enrichment_json(self):
+        parsed = parse_enrichment_json('```json\n{"summary": " Test Summary ", "topics": ["Topic1", " Topic2 "]}\n```')
+        self.assertEqual(parsed, {"summary": "Test Summary", "topics": ["Topic1", "Topic2"]})  # check fenced JSON is parsed and trimmed
+        self.assertIsNone(parse_enrichment_json("Summary: not JSON"))  # check prose is rejected
+        self.assertIsNone(parse_enrichment_json('{"summary": "Test Summary", "topics": "Topic1"}'))  # check topics must be a list
+        print("Test `test_parse_enrichment_json`: PASSED")
+
+    # a malformed combined reply should fall back to the two-call path
+    @patch('backend.api.ENRICHMENT_MODE', 'combined')
+    @patch('backend.api.enrichment_cache')
+    @patch('backend.api.llm')
+    def test_enrich_article_combined_falls_back(self, mock_llm, mock_cache):
+        mock_cache.get.return_value = None
+        replies = ['not json', 'Test Summary', 'Topic1\nTopic2']
+        mock_llm.create.side_effect = [
+            MagicMock(choices=[MagicMock(message=MagicMock(content=reply))]) for reply in replies
+        ]
+
+        article_data = {
+            "source": "Test Source",
+            "title": "Test Title",
+            "content": "This is a test content."
+        }
+        enrich_article(article_data)
+        self.assertEqual(mock_llm.create.call_count, 3)  # check the combined call was followed by both fallback calls
+        self.assertEqual(article_data['summary'], "Test Summary")
+        self.assertEqual(article_data['topics'], ["Topic1", "Topic2"])
+        print("Test `test_enrich_article_combined_falls_back`: PASSED")
+
+    def test_plan_batches_respects_budget(self):
+        contents = ["a" * 400, "b" * 400, "c" * 400, "d" * 40]  # ~100, 100, 100 and 10 tokens
+        self.assertEqual(plan_batches(contents, token_budget=250, max_items=8), [[0, 1], [2, 3]])  # check the token budget splits batches
+        self.assertEqual(plan_batches(contents, token_budget=10000, max_items=3), [[0, 1, 2], [3]])  # check the item limit splits batches
+        print("Test `test_plan_batches_respects_budget`: PASSED")
+
+    # items missing from a batched reply should be retried on their own
+    @patch('backend.api.ENRICHMENT_MODE', 'batch')
+    @patch('backend.api.enrichment_cache')
+    @patch('backend.api.summarize_and_extract_with_openai')
+    @patch('backend.api.summarize_batch_with_openai')
+    def test_enrich_articles_batch_demultiplexes(self, mock_batch, mock_single, mock_cache):
+        mock_cache.get.return_value = None
+        mock_batch.return_value = {0: {"summary": "Summary A", "topics": ["Topic A"]}}
+        mock_single.return_value = {"summary": "Summary B", "topics": ["Topic B"]}
+
+        articles = [
+            {"title": "A", "content": "Content A"},
+            {"title": "B", "content": "Content B"},
+            {"title": "C", "content": "No abstract available"}
+        ]
+        enrich_articles(articles)
+        mock_batch.assert_called_once_with(["Content A", "Content B"])  # check both abstracts shared one prompt
+        mock_single.assert_called_once_with("Content B")  # check the missing item was retried alone
+        self.assertEqual(articles[0]['summary'], "Summary A")
+        self.assertEqual(articles[1]['topics'], ["Topic B"])
+        self.assertEqual(articles[2]['topics'], ["Lack of available content", "Inability to create a summary"])
+        print("Test `test_enrich_articles_batch_demultiplexes`: PASSED")
+
+    # articles should be streamed before their enrichment finishes
+    @patch('backend.api.search_local', return_value=[])
+    @patch('backend.api.retrieve_cornell', return_value=[{"title": "A", "content": "Content A"}])
+    @patch('backend.api.retrieve_euro', return_value=[{"title": "B", "content": "Content B"}])
+    @patch('backend.api.retrieve_ieee', return_value=[])
+    @patch('backend.api.enrich_article', side_effect=lambda article: article.update({"summary": "S", "topics": []}))
+    @patch('backend.api.save_articles')
+    def test_iter_retrieve_all_streams_events(self, mock_save_articles, mock_enrich, *mock_providers):
+        events = list(iter_retrieve_all("test_keywords"))
+        kinds = [event for event, index, data in events]
+
+        self.assertEqual(kinds.count("article"), 2)  # check both articles were streamed
+        self.assertEqual(kinds.count("enriched"), 2)  # check both enrichments were streamed
+        self.assertEqual(kinds[-1], "done")  # check the stream ends with the timings
+        self.assertEqual(set(events[-1][2]), {"Cornell Arxiv", "Europe PMC", "IEEE Xplore"})
+        mock_save_articles.assert_called_once()  # check the search was saved in one write
+        self.assertEqual(len(mock_save_articles.call_args[0][0]), 2)  # check every article was saved
+        print("Test `test_iter_retrieve_all_streams_events`: PASSED")
+
+    # articles enriched before the client went away should still be saved
+    @patch('backend.api.search_local', return_value=[])
+    @patch('backend.api.retrieve_cornell', return_value=[{"title": "A", "content": "Content A"}])
+    @patch('backend.api.retrieve_euro', return_value=[{"title": "B", "content": "Content B"}])
+    @patch('backend.api.retrieve_ieee', return_value=[])
+    @patch('backend.api.enrich_article', side_effect=lambda article: article.update({"summary": "S", "topics": []}))
+    @patch('backend.api.save_articles')
+    def test_iter_retrieve_all_saves_on_disconnect(self, mock_save_articles, mock_enrich, *mock_providers):
+        stream = iter_retrieve_all("test_keywords")
+        kinds = []
+        while kinds.count("article") < 2:
+            kinds.append(next(stream)[0])
+        stream.close()  # what the SSE response does when the client disconnects
+
+        mock_save_articles.assert_called_once()  # check the search was still saved
+        saved = mock_save_articles.call_args[0][0]
+        self.assertTrue(saved)  # check the enrichment already paid for was kept
+        self.assertTrue(all(article.get("summary") == "S" for article in saved))  # check only enriched articles were saved
+        print("Test `test_iter_retrieve_all_saves_on_disconnect`: PASSED")
+
+    # history pages should be range queries on _id without the large fields
+    @patch('backend.api.collection')
+    def test_get_articles_paginates(self, mock_collection):
+        ids = [ObjectId() for _ in range(3)]
+        cursor = mock_collection.find.return_value.sort.return_value.limit.return_value
+        cursor.__iter__.return_value = [{"_id": _id, "title": "T"} for _id in ids]
+
+        before = str(ObjectId())
+        articles, next_cursor = get_articles(limit=2, before=before, source="Europe PMC")
+        query, projection = mock_collection.find.call_args[0]
+        self.assertEqual(query, {"source": "Europe PMC", "_id": {"$lt": ObjectId(before)}})  # check the page is a range query
+        self.assertEqual(projection, {"content": 0, "embedding": 0})  # check the large fields are left out
+        mock_collection.find.return_value.sort.return_value.limit.assert_called_once_with(3)  # check one extra document is fetched
+        self.assertEqual(len(articles), 2)
+        self.assertEqual(next_cursor, str(ids[1]))  # check the next page starts after the last article shown
+        self.assertEqual(get_articles(before="not-an-id"), ([], None))  # check invalid cursors are rejected
+        print("Test `test_get_articles_paginates`: PASSED")
+
+    # the history filter should match any article whose searches included the keyword
+    def test_get_articles_filters_by_keyword(self):
+        services.override("mongo", mongomock.MongoClient())
+        try:
+            save_articles([{"doi": "10.1/a", "title": "A"}], "graph networks")
+            save_articles([{"doi": "10.1/b", "title": "B"}], "graph molecules")
+            save_articles([{"doi": "10.1/c", "title": "C"}], "proteins")
+
+            titles = lambda keyword: sorted(article["title"] for article in collection.find(articles_query(keyword=keyword)))
+            self.assertEqual(titles("Graph"), ["A", "B"])  # check a single word matches within the keywords
+            self.assertEqual(titles("networks graph"), ["A"])  # check several words must all match
+        finally:
+            services.clear_overrides()
+        print("Test `test_get_articles_filters_by_keyword`: PASSED")
+
+    # enough stored matches should answer the search without going upstream
+    @patch('backend.api.LOCAL_TARGET', 2)
+    @patch('backend.api.fetch_articles')
+    @patch('backend.api.search_local')
+    def test_retrieve_all_answers_from_local_corpus(self, mock_search_local, mock_fetch_articles):
+        mock_search_local.return_value = [{"title": "A", "summary": "S"}, {"title": "B", "summary": "S"}]
+        results = retrieve_all("test_keywords")
+        self.assertEqual(len(results), 2)  # check the stored articles are returned
+        mock_fetch_articles.assert_not_called()  # check no provider was queried
+        print("Test `test_retrieve_all_answers_from_local_corpus`: PASSED")
+
+    # stored articles matching only some keywords, or weakly, should not stop the upstream fetch
+    @patch('backend.api.LOCAL_TARGET', 2)
+    @patch('backend.api.OFFLINE', False)
+    @patch('backend.api.save_articles')
+    @patch('backend.api.enrich_articles', side_effect=lambda articles: articles)
+    @patch('backend.api.fetch_articles', return_value=([{"title": "Fresh"}], {}))
+    @patch('backend.api.attach_content', side_effect=lambda articles: articles)
+    @patch('backend.api.collection')
+    def test_retrieve_all_ignores_weak_local_matches(self, mock_collection, mock_attach_content, mock_fetch_articles, *mocks):
+        cursor = mock_collection.find.return_value.sort.return_value.limit.return_value
+        cursor.__iter__.return_value = [{"title": "Loosely related", "score": 3.0}, {"title": "Barely related", "score": 1.0}]
+
+        results = retrieve_all("graph networks")
+        query_filter = mock_collection.find.call_args[0][0]
+        self.assertEqual(query_filter["$text"], {"$search": '"graph" "networks"'})  # check every keyword is required
+        self.assertEqual(query_filter["summary"], {"$exists": True})  # check articles stored without a summary don't count
+        mock_fetch_articles.assert_called_once()  # check the providers were still queried
+        self.assertEqual([article["title"] for article in results], ["Fresh"])  # check weak matches were left out
+        print("Test `test_retrieve_all_ignores_weak_local_matches`: PASSED")
+
+    # upstream articles already found locally should not be enriched again
+    @patch('backend.api.LOCAL_TARGET', 2)
+    @patch('backend.api.save_articles')
+    @patch('backend.api.enrich_articles', side_effect=lambda articles: articles)
+    @patch('backend.api.fetch_articles')
+    @patch('backend.api.search_local')
+    def test_retrieve_all_fetches_only_missing(self, mock_search_local, mock_fetch_articles, mock_enrich_articles, mock_save_articles):
+        stored = {"url": "http://arxiv.org/abs/2101.00001v1", "title": "A", "summary": "S"}
+        mock_search_local.return_value = [stored]
+        mock_fetch_articles.return_value = ([{"url": "http://arxiv.org/abs/2101.00001v1", "title": "A"}, {"title": "B"}], {})
+
+        results = retrieve_all("test_keywords")
+        self.assertEqual(mock_enrich_articles.call_args[0][0], [{"title": "B"}])  # check only the new article is enriched
+        self.assertEqual(results, [stored, {"title": "B"}])  # check stored and new articles are combined
+        print("Test `test_retrieve_all_fetches_only_missing`: PASSED")
+
+    # without an API key the chat should fail gracefully instead of raising
+    @patch('backend.api.OFFLINE', False)
+    @patch('backend.api.api_key', None)
+    @patch('backend.api.enrichment_cache.get', return_value=None)
+    def test_gpt_output_without_api_key(self, mock_cache_get):
+        services.reset()  # build the chat client again with the settings above
+        try:
+            self.assertEqual(gpt_output("What is new?"), {"error": "ChatBot failed"})  # check the error reply is returned
+            self.assertEqual(summarize_with_openai("Some content"), "Summarization failed")  # check enrichment degrades too
+        finally:
+            services.reset()
+        print("Test `test_gpt_output_without_api_key`: PASSED")
+
+    # the context should keep the best matches that fit the token budget
+    def test_pack_context_respects_budget(self):
+        articles = [
+            {"title": "A", "source": "Europe PMC", "summary": "x" * 200, "topics": ["T1", "T2"]},
+            {"title": "No summary", "source": "IEEE Xplore"},
+            {"title": "B", "source": "Cornell Arxiv", "summary": "y" * 200},
+            {"title": "C", "source": "Cornell Arxiv", "summary": "z" * 200},
+        ]
+        context = pack_context(articles, token_budget=130)
+        self.assertTrue(context.startswith("[1] A (Europe PMC)\nTopics: T1, T2"))  # check the best match comes first
+        self.assertIn("[2] B", context)  # check articles without a summary are skipped
+        self.assertNotIn("[3]", context)  # check the budget cut off the last article
+        print("Test `test_pack_context_respects_budget`: PASSED")
+
+    # repeated questions in RAG mode should reuse the cached context and answer
+    @patch('backend.api.CHAT_RAG', True)
+    @patch('backend.api.llm.create')
+    @patch('backend.api.search_local')
+    def test_gpt_output_rag_caches_answers(self, mock_search_local, mock_create):
+        mock_search_local.return_value = [{"title": "Stored paper", "source": "Europe PMC", "summary": "It works."}]
+        mock_create.return_value.choices[0].message = {"content": "It works [1]."}
+
+        self.assertEqual(gpt_output("Does it work?"), "It works [1].")
+        self.assertEqual(gpt_output("does it   work?"), "It works [1].")
+        mock_search_local.assert_called_once()  # check the context was cached by normalized question
+        mock_create.assert_called_once()  # check the answer was cached
+        system = mock_create.call_args.kwargs["messages"][0]["content"]
+        self.assertIn("[1] Stored paper (Europe PMC)", system)  # check the stored summary was put in the prompt
+        print("Test `test_gpt_output_rag_caches_answers`: PASSED")
 
 # run the tests
 if __name__ == '__main__':
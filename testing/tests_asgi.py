@@ -0,0 +1,78 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import json
+import tempfile
+import time
+import sys
+import os
+
+# ensure the front and backend modules can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# mock environment variables
+os.environ['OPENAI_API_KEY'] = 'test_openai_api_key'
+os.environ['MONGODB_URI'] = 'test_mongodb_uri'
+# run against mongomock and the offline chat client, without job worker threads
+os.environ['OFFLINE'] = '1'
+os.environ['JOB_WORKERS'] = '0'
+os.environ.setdefault('JOB_DB_PATH', os.path.join(tempfile.mkdtemp(), 'jobs.db'))
+
+from front.app import app
+from front.asgi import asgi_app
+
+LATENCY = 0.5
+
+
+# Function to send one request straight to the ASGI app; returns the status and body
+async def asgi_request(method, path, body=b""):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(scope, receive, send)
+    status = next(message["status"] for message in sent if message["type"] == "http.response.start")
+    return status, b"".join(message.get("body", b"") for message in sent if message["type"] == "http.response.body")
+
+
+# Function to send `count` chat requests at once; returns their responses and the wall time
+def concurrent_chats(count):
+    async def main():
+        body = json.dumps({"message": "What is new in graph networks?"}).encode()
+        return await asyncio.gather(*(asgi_request("POST", "/chat", body) for _ in range(count)))
+
+    started = time.perf_counter()
+    responses = asyncio.run(main())
+    return responses, time.perf_counter() - started
+
+
+def slow_answer(user_input):
+    time.sleep(LATENCY)
+    return "An answer"
+
+
+class TestAsgi(unittest.TestCase):
+
+    # a slow chat answer should not hold up the other requests
+    @patch('front.app.gpt_output', side_effect=slow_answer)
+    def test_concurrent_chats_run_in_parallel(self, mock_gpt_output):
+        responses, wall = concurrent_chats(48)
+        self.assertEqual([status for status, body in responses], [200] * 48)
+        self.assertEqual(json.loads(responses[0][1]), {"response": "An answer"})
+        self.assertLess(wall, 2 * LATENCY)  # check every request overlapped, with no fixed cap on threads
+        print("Test `test_concurrent_chats_run_in_parallel`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
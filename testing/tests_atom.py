@@ -0,0 +1,60 @@
+import unittest
+import sys
+import os
+import feedparser
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.atom import ArxivAtomParser, iter_arxiv_entries
+
+FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:arxiv="http://arxiv.org/schemas/atom">
+  <title>ArXiv Query</title>
+  <id>http://arxiv.org/api/query</id>
+  <entry>
+    <id>http://arxiv.org/abs/2401.00001v1</id>
+    <title>Graph Networks
+  for Protein Folding &amp; Design</title>
+    <summary>  We study folding.
+  Results are promising.
+</summary>
+    <author><name>A. Author</name></author>
+    <arxiv:primary_category term="cs.LG"/>
+  </entry>
+  <entry>
+    <id>http://arxiv.org/abs/2401.00002v1</id>
+    <title>Second Paper</title>
+    <summary>Another abstract.</summary>
+  </entry>
+</feed>"""
+
+
+class TestAtom(unittest.TestCase):
+
+    # the streaming parser should give the same articles as feedparser
+    def test_matches_feedparser(self):
+        expected = [
+            {"source": "Cornell Arxiv", "url": entry.id, "title": entry.title, "content": entry.summary}
+            for entry in feedparser.parse(FEED).entries
+        ]
+        self.assertEqual(list(iter_arxiv_entries([FEED])), expected)  # check fields and whitespace handling match
+        print("Test `test_matches_feedparser`: PASSED")
+
+    # entries should come out as soon as they close, whatever the chunk boundaries
+    def test_parses_incrementally(self):
+        parser = ArxivAtomParser()
+        split = FEED.index(b"</entry>") + len(b"</entry>")
+        first = parser.feed(FEED[:split])
+        self.assertEqual([article["title"] for article in first], ["Graph Networks\n  for Protein Folding & Design"])  # check the first entry is ready early
+        rest = []
+        for i in range(split, len(FEED), 7):
+            rest.extend(parser.feed(FEED[i:i + 7]))
+        rest.extend(parser.close())
+        self.assertEqual([article["url"] for article in rest], ["http://arxiv.org/abs/2401.00002v1"])
+        self.assertEqual(len(parser.root), 2)  # check finished entries were dropped from the tree
+        print("Test `test_parses_incrementally`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import mongomock
+from datetime import datetime, timedelta
+from backend.cache import LRUCache, MongoStore, EnrichmentCache
+
+
+class TestCache(unittest.TestCase):
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # touch "a" so "b" becomes the oldest entry
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))  # check the oldest entry was evicted
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        print("Test `test_lru_evicts_least_recently_used`: PASSED")
+
+    def test_key_depends_on_model_and_prompt_version(self):
+        base = EnrichmentCache.key("summary", "abstract", "gpt-3.5-turbo", 1)
+        self.assertEqual(base, EnrichmentCache.key("summary", "abstract", "gpt-3.5-turbo", 1))  # check keys are stable
+        self.assertNotEqual(base, EnrichmentCache.key("summary", "abstract", "gpt-4", 1))  # check the model changes the key
+        self.assertNotEqual(base, EnrichmentCache.key("summary", "abstract", "gpt-3.5-turbo", 2))  # check the prompt version changes the key
+        print("Test `test_key_depends_on_model_and_prompt_version`: PASSED")
+
+    def test_store_hit_is_promoted_to_memory(self):
+        store = MagicMock()
+        store.get.return_value = "stored summary"
+        cache = EnrichmentCache(LRUCache(), store)
+
+        self.assertEqual(cache.get("k"), "stored summary")  # check the persistent tier is consulted
+        self.assertEqual(cache.get("k"), "stored summary")
+        store.get.assert_called_once_with("k")  # check the second lookup is served from memory
+        self.assertEqual(cache.stats()["store_hits"], 1)
+        self.assertEqual(cache.stats()["memory_hits"], 1)
+        print("Test `test_store_hit_is_promoted_to_memory`: PASSED")
+
+    def test_miss_is_counted_and_set_writes_both_tiers(self):
+        collection = MagicMock()
+        collection.find_one.return_value = None
+        cache = EnrichmentCache(LRUCache(), MongoStore(collection))
+
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.stats()["misses"], 1)  # check the miss is counted
+        cache.set("k", ["Topic1"])
+        collection.update_one.assert_called_once_with({"_id": "k"}, {"$set": {"value": ["Topic1"]}}, upsert=True)  # check the value is persisted
+        self.assertEqual(cache.get("k"), ["Topic1"])
+        print("Test `test_miss_is_counted_and_set_writes_both_tiers`: PASSED")
+
+    def test_mongo_store_entries_expire(self):
+        collection = mongomock.MongoClient().db.cache
+        store = MongoStore(collection, ttl=60)
+        store.set("k", {"value": ["A"]})
+        self.assertEqual(store.get("k"), {"value": ["A"]})
+        expires_at = collection.find_one({"_id": "k"})["expires_at"]
+        self.assertAlmostEqual((expires_at - datetime.utcnow()).total_seconds(), 60, delta=5)  # check the TTL index has a date to expire on
+
+        collection.update_one({"_id": "k"}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+        self.assertIsNone(store.get("k"))  # check an expired entry is ignored before MongoDB deletes it
+        print("Test `test_mongo_store_entries_expire`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import json
+import time
+import sys
+import os
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.fanout import fan_out, time_left, _timed_call
+
+
+# helper that sleeps before returning the given value
+def slow_call(delay, value):
+    time.sleep(delay)
+    return value
+
+
+# helper that always fails
+def failing_call():
+    raise RuntimeError("provider down")
+
+
+class TestFanOut(unittest.TestCase):
+
+    def test_calls_run_concurrently(self):
+        calls = {
+            "a": (slow_call, {"delay": 0.3, "value": ["a"]}),
+            "b": (slow_call, {"delay": 0.3, "value": ["b"]}),
+            "c": (slow_call, {"delay": 0.3, "value": ["c"]}),
+        }
+        started = time.perf_counter()
+        results, timings = fan_out(calls, default_budget=2)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(results, {"a": ["a"], "b": ["b"], "c": ["c"]})  # check every result came back
+        self.assertLess(elapsed, 0.8)  # check wall time tracks the slowest call, not the sum
+        self.assertTrue(all(t["status"] == "ok" for t in timings.values()))  # check every call is reported ok
+        print("Test `test_calls_run_concurrently`: PASSED")
+
+    def test_slow_call_returns_partial_results(self):
+        calls = {
+            "fast": (slow_call, {"delay": 0.01, "value": ["fast"]}),
+            "slow": (slow_call, {"delay": 1.0, "value": ["slow"]}),
+        }
+        results, timings = fan_out(calls, budgets={"slow": 0.2}, default_budget=2)
+
+        self.assertEqual(results, {"fast": ["fast"]})  # check only the fast call is kept
+        self.assertEqual(timings["slow"]["status"], "timeout")  # check the slow call is reported as timed out
+        self.assertEqual(timings["fast"]["status"], "ok")
+        print("Test `test_slow_call_returns_partial_results`: PASSED")
+
+    def test_failing_call_is_reported(self):
+        calls = {
+            "ok": (slow_call, {"delay": 0, "value": ["ok"]}),
+            "broken": (failing_call, {}),
+        }
+        results, timings = fan_out(calls)
+
+        self.assertEqual(results, {"ok": ["ok"]})  # check the failure does not affect other calls
+        self.assertEqual(timings["broken"]["status"], "error")  # check the failure is reported
+        print("Test `test_failing_call_is_reported`: PASSED")
+
+    def test_calls_see_their_deadline(self):
+        results, timings = fan_out({"a": (time_left, {})}, default_budget=2.0)
+        self.assertTrue(1.5 < results["a"] <= 2.0)  # check the call can tell how long its caller will wait
+        self.assertIsNone(time_left())  # check the deadline stays with the call
+        with self.assertRaises(TimeoutError):
+            _timed_call(slow_call, {"delay": 0, "value": []}, time.perf_counter() - 1)  # check calls queued past their budget are skipped
+        print("Test `test_calls_see_their_deadline`: PASSED")
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+    def test_forked_process_runs_calls(self):
+        calls = {"a": (slow_call, {"delay": 0, "value": ["a"]})}
+        fan_out(calls)  # the parent's pool threads are running before the fork
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                results, timings = fan_out(calls, default_budget=2.0)
+                os.write(write_end, json.dumps(results).encode())
+            finally:
+                os._exit(0)
+        os.close(write_end)
+        with os.fdopen(read_end) as pipe:
+            results = json.loads(pipe.read() or "null")
+        os.waitpid(pid, 0)
+        self.assertEqual(results, {"a": ["a"]})  # check the child ran the call instead of timing out
+        print("Test `test_forked_process_runs_calls`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
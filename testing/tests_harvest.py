@@ -0,0 +1,106 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import tempfile
+import json
+import sys
+import os
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# mock environment variables
+os.environ['OPENAI_API_KEY'] = 'test_openai_api_key'
+os.environ['IEEE_API_KEY'] = 'test_ieee_api_key'
+os.environ['MONGODB_URI'] = 'test_mongodb_uri'
+# run against mongomock and the offline chat client
+os.environ['OFFLINE'] = '1'
+
+from backend import harvest
+from backend.harvest import iter_harvest
+
+
+# helper that builds a Europe PMC page response
+def euro_page(count, next_cursor):
+    response = MagicMock(status_code=200)
+    response.json.return_value = {
+        "nextCursorMark": next_cursor,
+        "resultList": {"result": [
+            {"id": f"{next_cursor}-{i}", "title": "T", "abstractText": "A"} for i in range(count)
+        ]}
+    }
+    return response
+
+
+# helper that builds an arXiv Atom page with `count` entries
+def arxiv_page(start, count):
+    entries = "".join(
+        f"<entry><id>http://arxiv.org/abs/{start + i}</id><title>T</title><summary>S</summary></entry>"
+        for i in range(count)
+    )
+    feed = f'<feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'
+    response = MagicMock(status_code=200)
+    response.iter_content.return_value = [feed[:40].encode(), feed[40:].encode()]
+    return response
+
+
+@patch.dict(harvest.PROVIDER_LIMITS, {name: MagicMock() for name in harvest.PROVIDER_LIMITS})
+class TestHarvest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpoint = os.path.join(self.directory.name, "checkpoint.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    # arXiv pages should advance `start` and stop on a short page
+    @patch('backend.harvest.api.save_articles')
+    @patch('backend.harvest.api.arxiv_client.get')
+    def test_arxiv_pages_by_offset(self, mock_get, mock_save_articles):
+        mock_get.side_effect = [arxiv_page(0, 2), arxiv_page(2, 1)]
+        pages = list(iter_harvest("arxiv", "test_keywords", page_size=2, checkpoint_path=self.checkpoint))
+
+        self.assertEqual([len(page) for page in pages], [2, 1])  # check both pages were harvested
+        starts = [call.kwargs["params"]["start"] for call in mock_get.call_args_list]
+        self.assertEqual(starts, [0, 2])  # check the offset advanced by one page
+        self.assertEqual(mock_save_articles.call_count, 2)  # check each page was saved on its own
+        with open(self.checkpoint) as f:
+            state = json.load(f)["arxiv:test_keywords"]
+        self.assertEqual(state, {"position": 3, "harvested": 3})  # check the checkpoint records the last position
+        print("Test `test_arxiv_pages_by_offset`: PASSED")
+
+    # an interrupted Europe PMC harvest should resume from its saved cursor
+    @patch('backend.harvest.api.save_articles')
+    @patch('backend.harvest.api.euro_client.get')
+    def test_euro_resumes_from_cursor(self, mock_get, mock_save_articles):
+        mock_get.side_effect = [euro_page(2, "c1"), RuntimeError("connection lost")]
+        with self.assertRaises(RuntimeError):
+            list(iter_harvest("europepmc", "test_keywords", page_size=2, checkpoint_path=self.checkpoint))
+
+        mock_get.side_effect = [euro_page(1, "c2"), euro_page(0, "c2")]
+        pages = list(iter_harvest("europepmc", "test_keywords", page_size=2, checkpoint_path=self.checkpoint))
+
+        cursor = mock_get.call_args_list[2].kwargs["params"]["cursorMark"]
+        self.assertEqual(cursor, "c1")  # check the harvest resumed after the saved page
+        self.assertEqual([len(page) for page in pages], [1, 0])
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)["europepmc:test_keywords"]["harvested"], 3)  # check the count carried over
+        print("Test `test_euro_resumes_from_cursor`: PASSED")
+
+    # the limit should cut the last page and stop further requests
+    @patch('backend.harvest.api.save_articles')
+    @patch('backend.harvest.api.ieee_client.get')
+    def test_ieee_stops_at_limit(self, mock_get, mock_save_articles):
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"articles": [{"title": "T", "abstract": "A"} for _ in range(2)]}
+        mock_get.return_value = response
+
+        pages = list(iter_harvest("ieee", "test_keywords", limit=3, page_size=2))
+        self.assertEqual([len(page) for page in pages], [2, 1])  # check the last page was cut to the limit
+        records = [call.kwargs["params"]["start_record"] for call in mock_get.call_args_list]
+        self.assertEqual(records, [1, 3])  # check start_record is 1-based and advances
+        print("Test `test_ieee_stops_at_limit`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+import tempfile
+import time
+import sys
+import os
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.jobs import JobQueue, WorkerPool
+
+
+# helper that waits until a job leaves the queue
+def wait_for(queue, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.02)
+    return queue.get(job_id)
+
+
+class TestJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.queue = JobQueue(os.path.join(self.directory.name, "jobs.db"))
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.stop()
+        self.directory.cleanup()
+
+    def test_jobs_are_claimed_once_in_order(self):
+        first = self.queue.enqueue("search", {"keywords": "a"})
+        second = self.queue.enqueue("search", {"keywords": "b"})
+        self.assertEqual(self.queue.claim()["id"], first)  # check the oldest job is claimed first
+        self.assertEqual(self.queue.claim()["id"], second)
+        self.assertIsNone(self.queue.claim())  # check a running job can't be claimed again
+        self.assertEqual(self.queue.get(first)["status"], "running")
+        print("Test `test_jobs_are_claimed_once_in_order`: PASSED")
+
+    def test_worker_runs_job_and_records_progress(self):
+        def handler(payload, report):
+            report({"enriched": 1})
+            return {"results": [payload["keywords"]]}
+
+        pool = WorkerPool(self.queue, {"search": handler}, workers=1, poll_interval=0.05)
+        self.pools.append(pool)
+        pool.start()
+        job_id = self.queue.enqueue("search", {"keywords": "test_keywords"})
+        pool.notify()
+
+        job = wait_for(self.queue, job_id)
+        self.assertEqual(job["status"], "done")  # check the job finished
+        self.assertEqual(job["progress"], {"enriched": 1})  # check progress was stored
+        self.assertEqual(job["result"], {"results": ["test_keywords"]})  # check the result was stored
+        print("Test `test_worker_runs_job_and_records_progress`: PASSED")
+
+    def test_failed_job_records_error(self):
+        def handler(payload, report):
+            raise RuntimeError("provider down")
+
+        pool = WorkerPool(self.queue, {"search": handler}, workers=1, poll_interval=0.05)
+        self.pools.append(pool)
+        pool.start()
+        job_id = self.queue.enqueue("search", {"keywords": "test_keywords"})
+
+        job = wait_for(self.queue, job_id)
+        self.assertEqual(job["status"], "failed")  # check the failure is recorded
+        self.assertEqual(job["error"], "provider down")
+        print("Test `test_failed_job_records_error`: PASSED")
+
+    # a job left running by a dead worker goes back in the queue once its lease runs out
+    def test_expired_lease_is_requeued(self):
+        queue = JobQueue(self.queue.path, lease=0.1)
+        stale = queue.enqueue("search", {"keywords": "a"})
+        queue.claim()
+        time.sleep(0.2)
+        live = queue.enqueue("search", {"keywords": "b"})
+        queue.claim()
+
+        self.assertEqual(queue.requeue_expired(), 1)
+        self.assertEqual(queue.get(stale)["status"], "queued")  # check the expired job was requeued
+        self.assertEqual(queue.get(live)["status"], "running")  # check a job with a live lease was left alone
+        print("Test `test_expired_lease_is_requeued`: PASSED")
+
+    # a pool keeps renewing the leases of its own jobs and picks up stale ones when it starts
+    def test_pool_renews_leases_and_recovers_stale_jobs(self):
+        queue = JobQueue(self.queue.path, lease=0.3)
+        stale = queue.enqueue("search", {"keywords": "stale"})
+        queue.claim()
+        time.sleep(0.4)
+
+        def handler(payload, report):
+            time.sleep(0.6)
+            return payload["keywords"]
+
+        pool = WorkerPool(queue, {"search": handler}, workers=1, poll_interval=0.05, housekeeping_interval=0.05)
+        self.pools.append(pool)
+        pool.start()
+        job = wait_for(queue, stale)
+        self.assertEqual(job["status"], "done")  # check the stale job was requeued and run
+        self.assertEqual(job["result"], "stale")
+        print("Test `test_pool_renews_leases_and_recovers_stale_jobs`: PASSED")
+
+    def test_old_finished_jobs_are_pruned(self):
+        queue = JobQueue(self.queue.path, retention=0.1)
+        done = queue.enqueue("search", {"keywords": "a"})
+        queue.claim()
+        queue.complete(done, {})
+        waiting = queue.enqueue("search", {"keywords": "b"})
+        time.sleep(0.2)
+
+        self.assertEqual(queue.prune(), 1)
+        self.assertIsNone(queue.get(done))  # check the finished job was deleted
+        self.assertEqual(queue.get(waiting)["status"], "queued")  # check a queued job was kept
+        print("Test `test_old_finished_jobs_are_pruned`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
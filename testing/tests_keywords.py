@@ -0,0 +1,48 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import time
+import sys
+import os
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.keywords import KeywordExtractor, local_keywords
+
+
+# helper building a fake TextRazor response with the given entity ids
+def textrazor_response(*entity_ids):
+    response = MagicMock()
+    response.entities.return_value = [MagicMock(english_id=entity_id) for entity_id in entity_ids]
+    return response
+
+
+class TestKeywords(unittest.TestCase):
+
+    def test_local_keywords_drop_stopwords(self):
+        keywords = local_keywords("What are the latest papers about CRISPR gene editing in plants?")
+        self.assertEqual(keywords, ["crispr", "editing", "gene", "latest", "plants"])  # check stopwords are dropped and order is canonical
+        print("Test `test_local_keywords_drop_stopwords`: PASSED")
+
+    @patch('backend.keywords.textrazor.TextRazor')
+    def test_keywords_are_canonical_and_cached(self, mock_textrazor):
+        mock_textrazor.return_value.analyze.return_value = textrazor_response("Machine learning", "Protein folding", "machine")
+        extractor = KeywordExtractor(api_key="test_textrazor_api_key")
+
+        first = extractor.query("How is machine learning used for protein folding?")
+        second = extractor.query("  how is MACHINE learning used for protein folding? ")
+        self.assertEqual(first, "folding learning machine protein")  # check words are deduplicated and sorted
+        self.assertEqual(second, first)  # check equivalent questions map to the same query
+        mock_textrazor.return_value.analyze.assert_called_once()  # check the second question was served from the cache
+        print("Test `test_keywords_are_canonical_and_cached`: PASSED")
+
+    @patch('backend.keywords.textrazor.TextRazor')
+    def test_slow_remote_falls_back_to_local(self, mock_textrazor):
+        mock_textrazor.return_value.analyze.side_effect = lambda question: time.sleep(0.5) or textrazor_response("Slow")
+        extractor = KeywordExtractor(api_key="test_textrazor_api_key", timeout=0.05)
+        self.assertEqual(extractor.extract("quantum error correction"), ["correction", "error", "quantum"])  # check the local extractor answered
+        print("Test `test_slow_remote_falls_back_to_local`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import time
+import sys
+import os
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import openai
+from backend.llm import TokenBucket, ChatClient, call_with_retry
+
+
+class TestLlm(unittest.TestCase):
+
+    def test_token_bucket_waits_when_empty(self):
+        bucket = TokenBucket(per_minute=600, capacity=1)  # 10 tokens per second, 1 at a time
+        bucket.acquire()
+        started = time.perf_counter()
+        bucket.acquire()
+        self.assertGreaterEqual(time.perf_counter() - started, 0.08)  # check the second acquire waited for a refill
+        print("Test `test_token_bucket_waits_when_empty`: PASSED")
+
+    # skip the backoff sleeps
+    @patch('backend.llm.time.sleep')
+    def test_retries_rate_limit_errors(self, mock_sleep):
+        func = MagicMock(side_effect=[openai.error.RateLimitError("slow down"), "ok"])
+        self.assertEqual(call_with_retry(func), "ok")  # check the call succeeds after a retry
+        self.assertEqual(func.call_count, 2)
+        mock_sleep.assert_called_once()  # check we backed off before retrying
+        print("Test `test_retries_rate_limit_errors`: PASSED")
+
+    @patch('backend.llm.time.sleep')
+    def test_does_not_retry_client_errors(self, mock_sleep):
+        func = MagicMock(side_effect=openai.error.InvalidRequestError("bad prompt", None))
+        with self.assertRaises(openai.error.InvalidRequestError):
+            call_with_retry(func)
+        self.assertEqual(func.call_count, 1)  # check the error is raised without retrying
+        print("Test `test_does_not_retry_client_errors`: PASSED")
+
+    @patch('backend.llm.time.sleep')
+    @patch('backend.llm.openai.ChatCompletion.create')
+    def test_chat_client_retries_server_errors(self, mock_create, mock_sleep):
+        server_error = openai.error.APIError("upstream failed", http_status=502)
+        mock_create.side_effect = [server_error, "response"]
+        client = ChatClient(model="test-model")
+        response = client.create(messages=[{"role": "user", "content": "hi"}], max_tokens=10)
+        self.assertEqual(response, "response")  # check the 502 was retried
+        self.assertEqual(mock_create.call_args.kwargs["model"], "test-model")  # check the configured model is used
+        print("Test `test_chat_client_retries_server_errors`: PASSED")
+
+    @patch('backend.llm.openai.ChatCompletion.create')
+    def test_chat_client_streams_tokens(self, mock_create):
+        mock_create.return_value = iter([
+            {"choices": [{"delta": {"role": "assistant"}}]},
+            {"choices": [{"delta": {"content": "Hel"}}]},
+            {"choices": [{"delta": {"content": "lo"}}]},
+            {"choices": [{"delta": {}}]},
+        ])
+        client = ChatClient(model="test-model", concurrency=1, api_key="test-key")
+        tokens = list(client.stream(messages=[{"role": "user", "content": "hi"}], max_tokens=10))
+        self.assertEqual(tokens, ["Hel", "lo"])  # check only the text deltas are yielded
+        self.assertTrue(mock_create.call_args.kwargs["stream"])
+        self.assertEqual(mock_create.call_args.kwargs["api_key"], "test-key")  # check the client's own key is sent
+        self.assertTrue(client.in_flight.acquire(blocking=False))  # check the in-flight slot was released
+        print("Test `test_chat_client_streams_tokens`: PASSED")
+
+    # each client keeps its settings to itself instead of configuring the openai module
+    @patch('backend.llm.openai.ChatCompletion.create', return_value="response")
+    def test_chat_client_leaves_openai_module_alone(self, mock_create):
+        with patch.object(openai, "requestssession", None), patch.object(openai, "api_key", None):
+            first = ChatClient(model="first-model", api_key="first-key")
+            ChatClient(model="second-model", api_key="second-key")
+            first.create(messages=[{"role": "user", "content": "hi"}], max_tokens=10)
+            self.assertIsNone(openai.requestssession)  # check no session was installed globally
+            self.assertIsNone(openai.api_key)
+        self.assertEqual(mock_create.call_args.kwargs["api_key"], "first-key")  # check the call used its own client's key
+        self.assertEqual(mock_create.call_args.kwargs["model"], "first-model")
+        print("Test `test_chat_client_leaves_openai_module_alone`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
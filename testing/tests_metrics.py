@@ -0,0 +1,70 @@
+import unittest
+import asyncio
+import json
+import sys
+import os
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend import metrics
+from backend.metrics import Registry
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+        self.original = metrics.registry
+        metrics.registry = self.registry
+
+    def tearDown(self):
+        metrics.registry = self.original
+
+    def test_span_times_stages_and_counts_errors(self):
+        with metrics.span("provider", provider="arxiv"):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.span("provider", provider="arxiv"):
+                raise ValueError("bad feed")
+
+        self.assertEqual(self.registry.value("journalize_stage_seconds", stage="provider", provider="arxiv"), 2)  # check both runs were timed
+        self.assertEqual(self.registry.value("journalize_errors_total", stage="provider", provider="arxiv"), 1)  # check the failure was counted
+        print("Test `test_span_times_stages_and_counts_errors`: PASSED")
+
+    def test_traced_wraps_coroutines(self):
+        @metrics.traced("chat")
+        async def answer():
+            return "An answer"
+
+        self.assertEqual(asyncio.run(answer()), "An answer")
+        self.assertEqual(self.registry.value("journalize_stage_seconds", stage="chat"), 1)  # check the await was timed, not just the call
+        print("Test `test_traced_wraps_coroutines`: PASSED")
+
+    def test_debug_lines_only_at_debug_level(self):
+        with self.assertLogs(metrics.logger, level="DEBUG") as logs:
+            metrics.debug("provider_timings", timings={"arxiv": {"status": "ok", "seconds": 0.2}})
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["event"], "provider_timings")  # check the detail is logged as JSON
+        self.assertEqual(line["timings"]["arxiv"]["seconds"], 0.2)
+        with self.assertNoLogs(metrics.logger, level="INFO"):
+            metrics.debug("provider_timings", timings={})  # check nothing is written above debug level
+        print("Test `test_debug_lines_only_at_debug_level`: PASSED")
+
+    def test_render_prometheus_text(self):
+        self.registry.inc("journalize_llm_tokens_total", 42, model="gpt", kind="prompt")
+        self.registry.observe("journalize_stage_seconds", 0.2, stage="summary")
+        self.registry.register_collector(lambda: [("journalize_enrichment_cache_entries", "gauge", {}, 3)])
+
+        text = self.registry.render()
+        self.assertIn("# TYPE journalize_llm_tokens_total counter", text)
+        self.assertIn('journalize_llm_tokens_total{kind="prompt",model="gpt"} 42', text)
+        self.assertIn('journalize_stage_seconds_bucket{stage="summary",le="0.1"} 0', text)  # check buckets are cumulative
+        self.assertIn('journalize_stage_seconds_bucket{stage="summary",le="+Inf"} 1', text)
+        self.assertIn('journalize_stage_seconds_count{stage="summary"} 1', text)
+        self.assertIn("journalize_enrichment_cache_entries 3", text)  # check collectors are folded in
+        print("Test `test_render_prometheus_text`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
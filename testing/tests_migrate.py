@@ -0,0 +1,103 @@
+import unittest
+import sys
+import os
+import mongomock
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# mock environment variables
+os.environ['OPENAI_API_KEY'] = 'test_openai_api_key'
+os.environ['MONGODB_URI'] = 'test_mongodb_uri'
+# run against mongomock and the offline chat client
+os.environ['OFFLINE'] = '1'
+
+from backend import api
+from backend.vectors import VectorIndex
+from backend.migrate import iter_migrate, migrate_keywords
+
+CONTENT = "We propose a method for learning representations of molecules. " * 20
+
+
+class TestMigrate(unittest.TestCase):
+
+    def setUp(self):
+        api.services.override("mongo", mongomock.MongoClient())
+
+    def tearDown(self):
+        api.services.clear_overrides()
+
+    def test_saved_articles_keep_content_in_body_store(self):
+        article = {"source": "Cornell Arxiv", "url": "http://arxiv.org/abs/2101.00001v1", "title": "A", "content": CONTENT}
+        api.save_articles([article], "molecules")
+
+        stored = api.collection.find_one({"key": "arxiv:2101.00001"})
+        self.assertNotIn("content", stored)  # check the metadata stays slim
+        body = api.bodies.find_one({"_id": "arxiv:2101.00001"})
+        self.assertLess(len(body["content"]), len(CONTENT) // 4)  # check the content is stored compressed
+        self.assertEqual(api.get_article_content(str(stored["_id"])), CONTENT)  # check it loads on demand
+        print("Test `test_saved_articles_keep_content_in_body_store`: PASSED")
+
+    def test_migrate_moves_inline_bodies(self):
+        api.collection.insert_many([
+            {"key": "doi:10.1/a", "title": "A", "content": CONTENT, "embedding": [0.1, 0.2]},
+            {"title": "Legacy B", "content": "Text B"},  # saved before articles had keys
+            {"key": "doi:10.1/c", "title": "C"},
+        ])
+
+        totals = list(iter_migrate(batch_size=1))[-1]
+        self.assertEqual(totals["articles"], 2)
+        self.assertEqual(api.collection.count_documents({"content": {"$exists": True}}), 0)  # check no body is left inline
+        self.assertEqual(api.collection.count_documents({"embedding": {"$exists": True}}), 0)
+
+        legacy = api.collection.find_one({"title": "Legacy B"})
+        self.assertEqual(legacy["key"], api.article_key({"title": "Legacy B"}))  # check keyless articles got their key
+        self.assertEqual(api.get_article_content(str(legacy["_id"])), "Text B")
+        self.assertEqual(api.load_bodies(["doi:10.1/a"], ("embedding",))["doi:10.1/a"]["embedding"], [0.1, 0.2])
+        self.assertEqual(list(iter_migrate()), [])  # check a second run has nothing left to do
+        print("Test `test_migrate_moves_inline_bodies`: PASSED")
+
+    def test_saved_articles_collect_keywords(self):
+        article = {"source": "Europe PMC", "doi": "10.1/a", "title": "A"}
+        api.save_articles([article], "graph networks")
+        api.save_articles([dict(article, keywords=["ignored"])], "Molecules graph")
+
+        stored = api.collection.find_one({"key": "doi:10.1/a"})
+        self.assertEqual(sorted(stored["keywords"]), ["graph", "molecules", "networks"])  # check earlier searches are kept
+        print("Test `test_saved_articles_collect_keywords`: PASSED")
+
+    def test_migrate_keywords_to_arrays(self):
+        api.collection.insert_many([
+            {"key": "doi:10.1/a", "title": "A", "keywords": "graph Networks"},
+            {"key": "doi:10.1/b", "title": "B", "keywords": ["graph"]},
+        ])
+
+        self.assertEqual(migrate_keywords(), 1)
+        self.assertEqual(api.collection.find_one({"key": "doi:10.1/a"})["keywords"], ["graph", "networks"])  # check the string became canonical keywords
+        self.assertEqual(migrate_keywords(), 0)  # check a second run has nothing left to do
+        print("Test `test_migrate_keywords_to_arrays`: PASSED")
+
+    def test_vector_index_picks_up_stored_embeddings(self):
+        # Saved by another worker, so this process's index has never seen them
+        api.save_articles([
+            {"doi": "10.1/a", "title": "A", "embedding": [1.0, 0.0]},
+            {"doi": "10.1/b", "title": "B", "embedding": [0.0, 1.0]},
+        ], "graph")
+        index = VectorIndex()
+        index.add(["doi:10.1/a"], [[1.0, 0.0]])
+        sync = api.EmbeddingSync(batch_size=1)
+
+        sync(index)
+        self.assertEqual(len(index), 2)  # check the missing embedding was loaded
+        self.assertEqual(index.query([0.0, 1.0], k=1)[0][0], "doi:10.1/b")
+
+        api.bodies.insert_one({"_id": "doi:10.1/old", "embedding": [0.5, 0.5]})  # no embedded_at, so only a full scan finds it
+        api.save_articles([{"doi": "10.1/c", "title": "C", "embedding": [0.6, 0.8]}], "graph")
+        sync(index)
+        self.assertIn("doi:10.1/c", index)  # check embeddings saved since the last run are loaded
+        self.assertNotIn("doi:10.1/old", index)  # check later runs don't scan every stored embedding
+        print("Test `test_vector_index_picks_up_stored_embeddings`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
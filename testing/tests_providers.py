@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import MagicMock
+import threading
+import time
+import sys
+import os
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+from backend.providers import ProviderClient
+from backend.cache import LRUCache, ResponseCache
+
+
+# keep-alive handler that fails the first `failures` requests with a 503,
+# waits `delay` seconds before answering and supports ETag revalidation
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures = 0
+    delay = 0
+    hits = 0
+    retry_after = None
+
+    def do_GET(self):
+        StubHandler.hits += 1
+        time.sleep(StubHandler.delay)
+        if StubHandler.failures > 0:
+            StubHandler.failures -= 1
+            status, body = 503, b"unavailable"
+        elif self.headers.get("If-None-Match") == '"v1"':
+            status, body = 304, b""
+        else:
+            status, body = 200, b'{"ok": true}'
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", '"v1"')
+        if status == 503 and StubHandler.retry_after is not None:
+            self.send_header("Retry-After", str(StubHandler.retry_after))
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestProviders(unittest.TestCase):
+
+    def setUp(self):
+        StubHandler.failures = 0
+        StubHandler.delay = 0
+        StubHandler.hits = 0
+        StubHandler.retry_after = None
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/search"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        client = ProviderClient("stub", self.url)
+        for _ in range(5):
+            self.assertEqual(client.get(params={"query": "test"}).status_code, 200)
+        stats = client.stats()
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["connections_opened"], 1)  # check one keep-alive connection served every request
+        self.assertEqual(stats["pool_reuse"], 0.8)
+        print("Test `test_connections_are_reused`: PASSED")
+
+    def test_retries_server_errors(self):
+        StubHandler.failures = 2
+        client = ProviderClient("stub", self.url, retries=2, backoff=0)
+        self.assertEqual(client.get().status_code, 200)  # check the 503s were retried
+        self.assertEqual(client.stats()["errors"], 0)
+        print("Test `test_retries_server_errors`: PASSED")
+
+    def test_retry_after_past_budget_is_not_waited_for(self):
+        StubHandler.failures = 2
+        StubHandler.retry_after = 3
+        client = ProviderClient("stub", self.url, read_timeout=1, retries=2, budget=1)
+        started = time.perf_counter()
+        self.assertEqual(client.get().status_code, 503)  # check the 503 is handed back instead of waiting
+        self.assertLess(time.perf_counter() - started, 1)  # check the call stayed within its budget
+        self.assertEqual(StubHandler.hits, 1)
+        print("Test `test_retry_after_past_budget_is_not_waited_for`: PASSED")
+
+    def test_read_timeout_is_enforced(self):
+        StubHandler.delay = 0.5
+        client = ProviderClient("stub", self.url, read_timeout=0.1, retries=0)
+        with self.assertRaises(requests.RequestException):
+            client.get()  # check a stalled upstream can't hang the caller
+        self.assertEqual(client.stats()["error_rate"], 1.0)  # check the timeout is counted as an error
+        print("Test `test_read_timeout_is_enforced`: PASSED")
+
+    def test_fresh_cache_hit_skips_network(self):
+        cache = ResponseCache(LRUCache())
+        client = ProviderClient("stub", self.url, cache=cache, cache_ttl=60)
+        first = client.fetch({"query": "test"}, lambda response: [{"title": response.json()["ok"]}], "Test  Query", 2)
+        first[0]["summary"] = "changed by the caller"
+        second = client.fetch({"query": "test"}, lambda response: [{"title": response.json()["ok"]}], "test query", 2)
+
+        self.assertEqual(StubHandler.hits, 1)  # check the second call never reached the network
+        self.assertEqual(second, [{"title": True}])  # check callers can't modify the cached value
+        self.assertEqual(cache.stats()["hit_ratio"], 0.5)
+        print("Test `test_fresh_cache_hit_skips_network`: PASSED")
+
+    def test_stale_entry_is_revalidated(self):
+        cache = ResponseCache(LRUCache())
+        client = ProviderClient("stub", self.url, cache=cache, cache_ttl=0)
+        parse = MagicMock(return_value=["parsed"])
+        client.fetch({}, parse, "test", 2)
+        self.assertEqual(client.fetch({}, parse, "test", 2), ["parsed"])  # check the 304 reused the cached value
+
+        self.assertEqual(StubHandler.hits, 2)  # check the stale entry was revalidated upstream
+        parse.assert_called_once()  # check the 304 was not parsed again
+        self.assertEqual(cache.stats()["revalidated"], 1)
+        print("Test `test_stale_entry_is_revalidated`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.services import Services
+
+
+class TestServices(unittest.TestCase):
+
+    def setUp(self):
+        self.services = Services()
+        self.factory = MagicMock(side_effect=lambda: MagicMock(name="client"))
+        self.services.register("client", self.factory)
+
+    def test_clients_are_created_lazily_once(self):
+        proxy = self.services.proxy("client")
+        self.factory.assert_not_called()  # check nothing is built until it is used
+        proxy.ping()
+        proxy.ping()
+        self.factory.assert_called_once()  # check the client is reused
+        print("Test `test_clients_are_created_lazily_once`: PASSED")
+
+    def test_forked_process_gets_new_clients(self):
+        parent = self.services.get("client")
+        with patch('backend.services.os.getpid', return_value=self.services.pid + 1):
+            child = self.services.get("client")
+        self.assertIsNot(child, parent)  # check a new process never reuses the parent's client
+        self.assertEqual(self.factory.call_count, 2)
+        print("Test `test_forked_process_gets_new_clients`: PASSED")
+
+    def test_override_and_patching_through_proxy(self):
+        fake = MagicMock()
+        self.services.override("client", fake)
+        proxy = self.services.proxy("client")
+        with patch.object(proxy, "ping", return_value="patched"):
+            self.assertEqual(proxy.ping(), "patched")  # check patches reach the real object
+        self.assertIsNot(proxy.ping(), "patched")  # check the patch was undone
+        self.factory.assert_not_called()  # check the override replaced the factory
+        print("Test `test_override_and_patching_through_proxy`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
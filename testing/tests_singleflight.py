@@ -0,0 +1,73 @@
+import unittest
+import asyncio
+import threading
+import time
+import sys
+import os
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.singleflight import SingleFlight, normalize_query
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_identical_calls_share_one_run(self):
+        flights = SingleFlight("test")
+        calls = []
+        started = threading.Event()
+
+        def search(keywords):
+            calls.append(keywords)
+            started.set()
+            time.sleep(0.1)
+            return [{"title": keywords}]
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.do("graph", search, "graph")))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(flights.do("graph", search, "graph"))) for _ in range(3)]
+        for thread in followers:
+            thread.start()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(calls, ["graph"])  # check the search ran once
+        self.assertEqual(results, [[{"title": "graph"}]] * 4)  # check every caller got the result
+        self.assertEqual(len({id(result) for result in results}), 4)  # check callers don't share one list
+        self.assertEqual(flights.do("graph", search, "graph"), [{"title": "graph"}])
+        self.assertEqual(len(calls), 2)  # check finished calls aren't cached
+        print("Test `test_identical_calls_share_one_run`: PASSED")
+
+    def test_errors_reach_every_waiter(self):
+        flights = SingleFlight("test")
+        started = threading.Event()
+
+        def failing():
+            started.set()
+            time.sleep(0.1)
+            raise RuntimeError("provider down")
+
+        errors = []
+
+        def call():
+            try:
+                flights.do("key", failing)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=call)
+        follower.start()
+        leader.join()
+        follower.join()
+        self.assertEqual(errors, ["provider down", "provider down"])  # check the waiter sees the failure too
+        print("Test `test_errors_reach_every_waiter`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()
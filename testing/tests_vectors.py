@@ -0,0 +1,79 @@
+import unittest
+import tempfile
+import threading
+import sys
+import os
+
+# ensure the backend module can be found
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend.vectors import VectorIndex, IndexSaver, find_duplicates
+
+
+class TestVectors(unittest.TestCase):
+
+    def test_query_returns_nearest_first(self):
+        index = VectorIndex()
+        index.add(["x", "y"], [[1, 0, 0], [0, 1, 0]])
+        index.add(["xy"], [[1, 1, 0]])  # incremental add after the first batch
+
+        matches = index.query([1, 0.1, 0], k=2)
+        self.assertEqual([key for key, score in matches], ["x", "xy"])  # check results are ranked by similarity
+        self.assertAlmostEqual(matches[0][1], 0.995, places=3)  # check scores are cosine similarities
+        print("Test `test_query_returns_nearest_first`: PASSED")
+
+    def test_readding_an_id_replaces_it(self):
+        index = VectorIndex()
+        index.add(["x"], [[1, 0]])
+        index.add(["x"], [[0, 1]])
+        self.assertEqual(len(index), 1)  # check the id was not duplicated
+        self.assertEqual(index.query([0, 1], k=1)[0][0], "x")  # check the new vector is used
+        print("Test `test_readding_an_id_replaces_it`: PASSED")
+
+    def test_save_and_load_round_trip(self):
+        index = VectorIndex()
+        index.add(["arxiv:1", "doi:2"], [[1, 0], [0, 1]])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.npz")
+            index.save(path)
+            loaded = VectorIndex.load(path)
+        self.assertEqual(len(loaded), 2)  # check every vector was persisted
+        self.assertEqual(loaded.query([0, 1], k=1)[0][0], "doi:2")  # check ids still map to their vectors
+        print("Test `test_save_and_load_round_trip`: PASSED")
+
+    def test_concurrent_saves_use_their_own_files(self):
+        indexes = [VectorIndex() for _ in range(4)]
+        for i, index in enumerate(indexes):
+            index.add([f"doi:{i}"], [[1, i]])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.npz")
+            threads = [threading.Thread(target=index.save, args=(path,)) for index in indexes for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(VectorIndex.load(path)), 1)  # check the file is one complete snapshot
+            self.assertEqual(os.listdir(directory), ["index.npz"])  # check no temporary file was left behind
+        print("Test `test_concurrent_saves_use_their_own_files`: PASSED")
+
+    def test_saver_writes_only_changes(self):
+        index = VectorIndex()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index.npz")
+            saver = IndexSaver(index, path, interval=60)
+            saver.save_if_changed()
+            self.assertFalse(os.path.exists(path))  # check an unchanged index is not written
+            index.add(["doi:1"], [[1, 0]])
+            saver.start()
+            saver.stop()
+            self.assertEqual(len(VectorIndex.load(path)), 1)  # check new vectors are written by the saver
+        print("Test `test_saver_writes_only_changes`: PASSED")
+
+    def test_find_duplicates(self):
+        vectors = [[1, 0], [0, 1], [0.99, 0.05], [0.7, 0.7]]
+        self.assertEqual(find_duplicates(vectors, threshold=0.95), [None, None, 0, None])  # check only the near-identical vector is collapsed
+        print("Test `test_find_duplicates`: PASSED")
+
+# run the tests
+if __name__ == '__main__':
+    unittest.main()